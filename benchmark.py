@@ -0,0 +1,196 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		benchmark.py
+# 		Purpose:	Benchmarks the resource build on a synthetic app, comparing against a stored baseline.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+#
+#	Generates an app tree of the requested size (XML data files, large master PNGs, sound banks), then times each
+#	library stage on its own and the whole build, each in a fresh process so the peak memory is that stage's.
+#
+#		python benchmark.py --size medium 					run and compare with the baseline
+#		python benchmark.py --size medium --save-baseline 	run and make this the baseline
+#
+from libraries.formatter import LuaFormatter
+from libraries.information import InformationLoader
+from libraries.textcopier import TextCopier
+from libraries.defaultfiles import DefaultFiles
+from libraries.copier import FileCopier
+from libraries.buildprofiler import peakMemory
+from resourcebuild import buildResources
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+import os,io,sys,json,time,random,shutil,struct,argparse,contextlib
+
+#
+#	Sizes of synthetic tree : XML files, entries in each, master images, master image size, sound Mb
+#
+PRESETS = { "small":	{ "xml":200, "entries":50, "masters":2, "masterSize":1024, "soundMb":16 },
+			"medium":	{ "xml":2000, "entries":100, "masters":4, "masterSize":2048, "soundMb":256 },
+			"large":	{ "xml":10000, "entries":200, "masters":4, "masterSize":4096, "soundMb":1024 } }
+
+#
+#	Make the synthetic app tree. It is random, but always the same for the same settings.
+#
+def generateTree(root,settings):
+	rnd = random.Random(42)
+	if os.path.isdir(root):
+		shutil.rmtree(root)
+	for d in ["source","temp","media"+os.sep+"text","media"+os.sep+"system","media"+os.sep+"sounds"]:
+		os.makedirs(root+os.sep+d)
+	shutil.copyfile("information.xml",root+os.sep+"information.xml")
+	for n in range(0,settings["xml"]): 													# XML data files.
+		with open(root+os.sep+"media"+os.sep+"text"+os.sep+"data{0:05d}.xml".format(n),"w") as f:
+			f.write("<data>\n")
+			for s in range(0,settings["entries"] // 10):
+				f.write("\t<section{0}>\n".format(s))
+				for e in range(0,10):
+					f.write('\t\t<item{0}>{1} "text" &amp; more {2}</item{0}>\n'.format(e,rnd.random(),"x" * rnd.randint(0,40)))
+				f.write("\t</section{0}>\n".format(s))
+			f.write("</data>\n")
+	for n in range(0,settings["masters"]): 												# master images, noisy so they're big
+		size = settings["masterSize"]
+		image = Image.frombytes("RGB",(size // 8,size // 8),bytes([rnd.randint(0,255) for i in range(0,size*size*3 // 64)]))
+		image = image.resize((size,size),Image.BICUBIC)
+		image.save(root+os.sep+"media"+os.sep+"system"+os.sep+("icon" if n % 2 == 0 else "launch")+str(n)+".png")
+	soundBytes = settings["soundMb"]*1024*1024
+	count = max(1,settings["soundMb"] // 8) 											# sound banks of about 8Mb
+	block = bytes([rnd.randint(0,255) for i in range(0,65536)])
+	for n in range(0,count):
+		size = soundBytes // count
+		with open(root+os.sep+"media"+os.sep+"sounds"+os.sep+"bank{0:04d}.wav".format(n),"wb") as f:
+			f.write(b"RIFF"+struct.pack("<I",size+36)+b"WAVEfmt "+struct.pack("<IHHIIHH",16,1,2,44100,44100*4,4,16))
+			f.write(b"data"+struct.pack("<I",size))
+			for i in range(0,size // len(block)):
+				f.write(block)
+			f.write(block[:size % len(block)])
+
+#
+#	Each benchmark is run in the app directory, with outputs and the manifest removed first, and returns
+#	(items,bytes) processed.
+#
+def clearOutputs():
+	for d in ["source","temp"]:
+		shutil.rmtree(d)
+		os.makedirs(d)
+	os.makedirs("source"+os.sep+"media")
+
+def benchFormatter(workers):
+	data = { "section{0}".format(s):{ "item{0}".format(i):"value {0} \"quoted\"".format(i*s) for i in range(0,1000) } for s in range(0,200) }
+	text = LuaFormatter().luaFormat(0,"return",data)
+	return (len(data)*1000,len(text))
+
+def benchInformation(workers):
+	loader = InformationLoader()
+	files = sorted(os.listdir("media"+os.sep+"text"))
+	for f in files:
+		loader.load("media"+os.sep+"text"+os.sep+f,{})
+	return (len(files),sum([os.path.getsize("media"+os.sep+"text"+os.sep+f) for f in files]))
+
+def benchText(workers):
+	text = TextCopier("media"+os.sep+"text",workers,4*1024*1024).copy(["xml"],"source"+os.sep+"media")
+	return (text.filesCopied,text.bytesCopied)
+
+def benchIcons(workers):
+	dic = DefaultFiles("media"+os.sep+"system","portrait",workers)
+	dic.create(False,"source",(0,0,0,255))
+	dic.create(True,"source",(255,255,255,0))
+	return (len(dic.timings),sum([t[2] for t in dic.timings]))
+
+def benchSounds(workers):
+	sounds = FileCopier("media"+os.sep+"sounds",workers).copy(["wav","mp3"],"source"+os.sep+"media")
+	return (sounds.filesCopied,sounds.bytesCopied)
+
+def benchBuild(workers):
+	with contextlib.redirect_stdout(io.StringIO()):
+		profiler = buildResources(workers)
+	return (sum([len(s.files) for s in profiler.stages]),sum([sum([f[2] for f in s.files]) for s in profiler.stages]))
+
+BENCHMARKS = [ ("formatter",benchFormatter),("information",benchInformation),("text",benchText),
+			   ("icons",benchIcons),("sounds",benchSounds),("build",benchBuild) ]
+
+#
+#	Run one benchmark, in a worker process of its own.
+#
+def runBenchmark(name,root,workers):
+	os.chdir(root)
+	clearOutputs()
+	function = dict(BENCHMARKS)[name]
+	start = time.time()
+	items,size = function(workers)
+	seconds = time.time()-start
+	return { "seconds":seconds, "items":items, "bytes":size, "itemsPerSecond":items/max(seconds,1e-9),
+			 "bytesPerSecond":size/max(seconds,1e-9), "peakMemory":peakMemory() }
+
+#
+#	Run all the benchmarks, returns a dictionary of results.
+#
+def runBenchmarks(root,workers,names):
+	results = {}
+	for name in names:
+		with ProcessPoolExecutor(max_workers = 1) as pool:
+			results[name] = pool.submit(runBenchmark,name,os.path.abspath(root),workers).result()
+	return results
+
+#
+#	Compare with the baseline, returns the number of regressions (more than tolerance slower, ignoring anything
+#	under a tenth of a second which is just noise)
+#
+def compare(results,baseline,tolerance):
+	regressions = 0
+	print("{0:12} {1:>9} {2:>9} {3:>7} {4:>14} {5:>10}".format("Stage","Seconds","Baseline","Ratio","Bytes/sec","Peak Mb"))
+	for name,r in results.items():
+		memory = max(r["peakMemory"].values()) // (1024*1024) if r["peakMemory"] is not None else 0
+		old = baseline.get(name)
+		ratio = r["seconds"] / old["seconds"] if old is not None and old["seconds"] > 0 else None
+		status = ""
+		if ratio is not None and ratio > 1+tolerance and r["seconds"]-old["seconds"] > 0.1:
+			status = "REGRESSION"
+			regressions += 1
+		print("{0:12} {1:9.3f} {2:>9} {3:>7} {4:14.0f} {5:10} {6}".format(name,r["seconds"],
+						"-" if old is None else "{0:.3f}".format(old["seconds"]),"-" if ratio is None else "{0:.2f}".format(ratio),
+						r["bytesPerSecond"],memory,status))
+	return regressions
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Benchmark the resource build on a synthetic app.")
+	parser.add_argument("--size",default = "small",choices = sorted(PRESETS.keys()),help = "size of synthetic app")
+	for k in PRESETS["small"].keys():
+		parser.add_argument("--"+k,type = int,help = "override the preset "+k)
+	parser.add_argument("-j","--jobs",type = int,default = os.cpu_count(),help = "number of worker processes")
+	parser.add_argument("--tree",default = "temp"+os.sep+"benchmark",help = "where to generate the synthetic app")
+	parser.add_argument("--keep",action = "store_true",help = "use the synthetic app already generated")
+	parser.add_argument("--only",nargs = "+",choices = [b[0] for b in BENCHMARKS],help = "run just these benchmarks")
+	parser.add_argument("--baseline",default = "temp"+os.sep+"benchmark.json",help = "baseline results file")
+	parser.add_argument("--save-baseline",action = "store_true",help = "store these results as the baseline")
+	parser.add_argument("--tolerance",type = float,default = 0.2,help = "fraction slower counted as a regression")
+	args = parser.parse_args()
+	settings = dict(PRESETS[args.size])
+	for k in settings.keys():
+		if getattr(args,k) is not None:
+			settings[k] = getattr(args,k)
+	key = ",".join(["{0}={1}".format(k,settings[k]) for k in sorted(settings.keys())])+",jobs="+str(args.jobs)
+	if not args.keep:
+		print("Generating        : "+args.tree+" ("+key+")")
+		generateTree(args.tree,settings)
+	results = runBenchmarks(args.tree,args.jobs,args.only or [b[0] for b in BENCHMARKS])
+	baselines = json.load(open(args.baseline)) if os.path.isfile(args.baseline) else {}
+	regressions = compare(results,baselines.get(key,{}),args.tolerance) 				# baselines kept per settings
+	if args.save_baseline:
+		baselines[key] = results
+		os.makedirs(os.path.dirname(args.baseline) or ".",exist_ok = True)
+		json.dump(baselines,open(args.baseline,"w"),indent = 1,sort_keys = True)
+		print("Baseline saved    : "+args.baseline)
+	sys.exit(1 if regressions > 0 and not args.save_baseline else 0)
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	Baseline kept in temp/benchmark.json rather than the root of the repository.
+# 
+#  ****************************************************************************************************************
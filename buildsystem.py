@@ -0,0 +1,59 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		buildsystem.py
+# 		Purpose:	Builds the system.zip file which can be used to update any application with the latest
+#					versions of scripts and similar.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+#
+#	It is advisable to check the final zip file produced to check nothing is in it that would zap any application
+#	files. Only files which have changed since the last system.zip are compressed again.
+#
+from libraries.packager import ZipPackager
+import os,argparse
+
+def buildSystem(zipFile,workers):
+	packager = ZipPackager(zipFile,workers)
+	#
+	#	The documentation, source and libraries.
+	#
+	for tree in ["source","documentation","libraries","version.txt","removedefaults.py"]:
+		packager.addTree(tree)
+	#
+	#	Remove main.lua, information.lua build.settings and config.lua which are generated, any stuff here for
+	#	testing the System but which we don't want generally, and compiled python files.
+	#
+	packager.remove("source/main.lua","source/information.lua","source/build.settings","source/config.lua")
+	packager.remove("source/__*.*","*.pyc","*/__pycache__/")
+	#
+	#	The graphics/sounds/text/fonts/systems directories but not their contents, and the temp directory used for
+	#	building resources.
+	#
+	for directory in ["media/graphics","media/sounds","media/text","media/fonts","media/system","temp"]:
+		if os.path.isdir(directory):
+			packager.addDirectory(directory)
+	#
+	#	The universal directory *and* its contents.
+	#
+	if os.path.isdir("media"+os.sep+"universal"):
+		packager.addTree("media"+os.sep+"universal")
+	return packager.write()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Build system.zip")
+	parser.add_argument("-j","--jobs",type = int,default = os.cpu_count(),help = "number of compressing threads")
+	parser.add_argument("--output",default = "system.zip",help = "zip file to build")
+	args = parser.parse_args()
+	packager = buildSystem(args.output,args.jobs)
+	print(args.output+" built successfully : "+packager.report())
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version, replaces the zip commands in buildsystem.bat
+# 
+#  ****************************************************************************************************************
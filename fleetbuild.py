@@ -0,0 +1,89 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		fleetbuild.py
+# 		Purpose:	Builds the resources of many apps in one go, sharing one cache between them.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+#
+#	Each app is built by resourcebuild.buildResources() in its own directory, in a pool of worker processes. The
+#	apps share one content cache, so artwork, text and sound banks which are the same in several apps are only
+#	processed once for the whole fleet.
+#
+#		python fleetbuild.py -j 4 ../app1 ../app2 ../app3
+#
+from resourcebuild import buildResources,pruneCache
+from concurrent.futures import ProcessPoolExecutor
+import os,io,sys,time,argparse,contextlib,traceback
+
+#
+#	Build one app, returns (app,seconds,output,error). Runs in a worker process, which moves to the app's directory
+#	as everything in the build is relative to it. Output is collected so the apps' output doesn't get mixed up.
+#
+def buildApp(appRoot,cacheDirectory,workers):
+	start = time.time()
+	output = io.StringIO()
+	error = None
+	current = os.getcwd()
+	try:
+		os.chdir(appRoot)
+		with contextlib.redirect_stdout(output):
+			profiler = buildResources(workers,None,cacheDirectory)
+			profiler.save("temp"+os.sep+"buildreport.json")
+	except Exception:																		# reported, not raised.
+		error = traceback.format_exc()
+	finally:
+		os.chdir(current)
+	return (appRoot,time.time()-start,output.getvalue(),error)
+
+#
+#	Build all the apps, returns the number that failed.
+#
+def buildFleet(appRoots,cacheDirectory,jobs):
+	cacheDirectory = os.path.abspath(cacheDirectory) 										# same for every app
+	appRoots = [os.path.abspath(a) for a in appRoots]
+	for a in appRoots:
+		assert os.path.isfile(a+os.sep+"information.xml"),"No information.xml in "+a
+	failed = 0
+	results = []
+	if jobs <= 1 or len(appRoots) <= 1:
+		for a in appRoots:																	# one at a time, all workers each.
+			results.append(buildApp(a,cacheDirectory,jobs))
+			failed += reportApp(*results[-1])
+	else:
+		with ProcessPoolExecutor(max_workers = min(jobs,len(appRoots))) as pool:		# one app per worker.
+			for result in pool.map(buildApp,appRoots,[cacheDirectory]*len(appRoots),[1]*len(appRoots)):
+				failed += reportApp(*result)
+	pruneCache(cacheDirectory) 																# all the apps are done with it.
+	return failed
+
+def reportApp(appRoot,seconds,output,error):
+	print("{0} ({1:.2f}s)".format(appRoot,seconds))
+	for line in output.rstrip().split("\n"):
+		print("    "+line)
+	if error is not None:
+		print("    Error : build failed.")
+		print("    "+error.rstrip().replace("\n","\n    "))
+		return 1
+	return 0
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Build resources for several apps, sharing a cache.")
+	parser.add_argument("apps",nargs = "+",help = "app root directories (containing information.xml)")
+	parser.add_argument("-j","--jobs",type = int,default = os.cpu_count(),help = "number of worker processes")
+	parser.add_argument("--cache",default = "temp"+os.sep+"fleetcache",help = "directory of the shared cache")
+	args = parser.parse_args()
+	failed = buildFleet(args.apps,args.cache,args.jobs)
+	print("{0} apps built, {1} failed.".format(len(args.apps)-failed,failed))
+	sys.exit(1 if failed > 0 else 0)
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	Shared cache is pruned once all the apps are built.
+# 
+#  ****************************************************************************************************************
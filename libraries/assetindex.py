@@ -0,0 +1,122 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		assetindex.py
+# 		Purpose:	Writes media/assetindex.lua, listing every asset built into source/media.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+import os
+from libraries.formatter import LuaFormatter
+from libraries.defaultfiles import pngSize
+
+#
+#	Type of asset from its extension.
+#
+ASSETTYPES = { ".png":"image", ".jpg":"image", ".wav":"sound", ".mp3":"sound", ".ogg":"sound", ".lua":"data",
+			   ".ttf":"font", ".otf":"font", ".fnt":"font" }
+
+#
+#	The index is a requireable module, so the app can find out about its assets without opening them :
+#
+#		local index = require("media.assetindex")
+#		index.assets["media/boom.wav"] 		-- { type = "sound", bytes = .., hash = .., tag = "level1" }
+#		index.tags.level1 						-- list of the assets for level1, to preload.
+#
+#	Images have width and height, data files the name to require them by. The tag is the subdirectory the asset
+#	came from (media/sounds/level1/boom.wav is tagged level1), found from the build manifest ; assets which
+#	weren't in a subdirectory have no tag. An asset which is the same as another has same = the name of the
+#	first one, so it need only be loaded once. Total bytes and the bytes without duplicates are also given.
+#
+#	Hashes are kept in the build manifest, so only files which have changed are hashed again. The index is only
+#	written if it has changed.
+#
+class AssetIndex:
+	def __init__(self,mediaDirectory,manifest):
+		self.mediaDirectory = mediaDirectory 												# source/media
+		self.manifest = manifest 															# manifest of this build
+		self.fileName = mediaDirectory+os.sep+"assetindex.lua"
+		self.assets = {} 																	# name => information
+		self.index = None
+
+	def generator(self):
+		return "AssetIndex:1:"+str(LuaFormatter.VERSION)
+
+	#
+	#	The asset files, sorted.
+	#
+	def scan(self):
+		files = []
+		for root,dirs,names in os.walk(self.mediaDirectory):
+			dirs.sort()
+			for f in sorted(names):
+				if root+os.sep+f != self.fileName and os.path.splitext(f)[1].lower() in ASSETTYPES:
+					files.append(root+os.sep+f)
+		return files
+
+	#
+	#	Output file => the tag of the sources it was built from, from the other entries in the manifest.
+	#
+	def tags(self):
+		tags = {}
+		for key,entry in self.manifest.items():
+			for source in entry["sources"]:
+				parts = os.path.normpath(source["path"]).split(os.sep)
+				if len(parts) > 3 and parts[0] == "media": 									# media/<type>/<tag>/...
+					for output in entry["outputs"]:
+						tags.setdefault(os.path.normpath(output["path"]),parts[2].lower())
+		return tags
+
+	def create(self):
+		files = self.scan()
+		tags = self.tags()
+		previous = { x["path"]:x for x in self.manifest.entries.get(self.fileName,{ "sources":[] })["sources"] }
+		sourceDirectory = os.path.dirname(self.mediaDirectory)
+		first = {} 																			# hash => first asset with it.
+		self.assets = {}
+		for f in files:
+			record = self.manifest.fileRecord(f,previous.get(f))
+			name = os.path.relpath(f,sourceDirectory).replace(os.sep,"/") 					# as the app names it.
+			extension = os.path.splitext(f)[1].lower()
+			asset = { "type":ASSETTYPES[extension], "bytes":record["size"], "hash":record["hash"] }
+			if extension == ".png":
+				asset["width"],asset["height"] = pngSize(f)
+			if extension == ".lua":
+				asset["module"] = name[:-4].replace("/",".")
+			if os.path.normpath(f) in tags:
+				asset["tag"] = tags[os.path.normpath(f)]
+			if record["hash"] in first:
+				asset["same"] = first[record["hash"]]
+			else:
+				first[record["hash"]] = name
+			self.assets[name] = asset
+		index = { "assets":self.assets, "tags":{},
+				  "bytes":sum([a["bytes"] for a in self.assets.values()]),
+				  "uniqueBytes":sum([a["bytes"] for a in self.assets.values() if "same" not in a]) }
+		for name in sorted(self.assets.keys()):
+			if "tag" in self.assets[name]:
+				index["tags"].setdefault(self.assets[name]["tag"],[]).append(name)
+		self.index = index
+		text = LuaFormatter().luaFormat(0,"return",index)
+		if not os.path.isfile(self.fileName) or open(self.fileName,encoding = "utf-8").read() != text:
+			with open(self.fileName,"w",encoding = "utf-8") as stream:
+				stream.write(text)
+		self.manifest.record(self.fileName,files,[self.fileName],self.generator())
+		return self
+
+	def report(self):
+		duplicates = len([a for a in self.assets.values() if "same" in a])
+		return "{0} assets ({1} bytes), {2} duplicates ({3} bytes), {4} tags".format(len(self.assets),self.index["bytes"],duplicates,
+																					 self.index["bytes"]-self.index["uniqueBytes"],len(self.index["tags"]))
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	Reads a snapshot of the manifest entries.
+#		18 Oct 26 	Generator includes the LuaFormatter VERSION.
+# 
+#  ****************************************************************************************************************
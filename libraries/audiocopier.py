@@ -0,0 +1,133 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		audiocopier.py
+# 		Purpose:	Sound copier which makes the sounds smaller on the way (using ffmpeg)
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+import os,shutil,subprocess
+from libraries.copier import FileCopier,fastCopy
+
+#
+#	Silence at the start and end is removed by trimming the start, reversing, trimming the start and reversing back.
+#
+TRIM_SILENCE = "silenceremove=start_periods=1:start_threshold={0}dB,areverse,silenceremove=start_periods=1:start_threshold={0}dB,areverse"
+
+#
+#	Bit rate in bits a second from ffmpeg's form, e.g. "96k"
+#
+def bitrateValue(bitrate):
+	scale = { "k":1000, "m":1000000 }.get(str(bitrate)[-1:].lower(),1)
+	return int(float(str(bitrate).rstrip("kKmM")) * scale)
+
+#
+#	Get (duration in seconds,bit rate) of a sound from ffprobe, either None if it can't be found.
+#
+def soundInfo(ffprobe,srcFile):
+	if ffprobe is None:
+		return None,None
+	result = subprocess.run([ffprobe,"-v","error","-show_entries","format=duration,bit_rate","-of","default=noprint_wrappers=1",srcFile],
+							stdout = subprocess.PIPE,stderr = subprocess.PIPE)
+	info = {}
+	for line in result.stdout.decode("utf-8","replace").split("\n"):
+		if "=" in line:
+			key,value = line.strip().split("=",1)
+			try:
+				info[key] = float(value)
+			except ValueError: 																# N/A
+				pass
+	return info.get("duration"),info.get("bit_rate")
+
+#
+#	Convert one sound, the type is given by the extension of the target. Run in a worker process if there is a
+#	shared pool, so ffmpeg counts as one of its workers.
+#
+#	Sounds shorter than effectLength seconds are effects : trimmed, mixed down to mono and resampled. Anything
+#	longer is music, which is trimmed but otherwise left as it is in a wav. An mp3 is only re-encoded (trimmed,
+#	and mono if an effect) if its bit rate is above musicBitrate, as every encoding loses something ; otherwise it
+#	is copied as it is. Sounds ffprobe can't measure are left as they are.
+#
+def convertSound(ffmpeg,ffprobe,srcFile,tgtFile,effectRate,musicBitrate,silence,effectLength):
+	duration,bitrate = soundInfo(ffprobe,srcFile)
+	isWav = tgtFile.lower().endswith(".wav")
+	if duration is None or (not isWav and (bitrate is None or bitrate <= bitrateValue(musicBitrate))):
+		shutil.copyfile(srcFile,tgtFile)
+		return
+	command = [ffmpeg,"-v","error","-y","-i",srcFile,"-map_metadata","-1","-af",TRIM_SILENCE.format(silence)]
+	if duration < effectLength:
+		command += ["-ac","1"] + (["-ar",str(effectRate)] if isWav else [])
+	command += ["-c:a","pcm_s16le"] if isWav else ["-c:a","libmp3lame","-b:a",musicBitrate]
+	result = subprocess.run(command+[tgtFile],stdout = subprocess.PIPE,stderr = subprocess.PIPE)
+	if result.returncode != 0:
+		raise RuntimeError("ffmpeg failed on "+srcFile+" : "+result.stderr.decode("utf-8","replace"))
+	if os.path.getsize(tgtFile) >= os.path.getsize(srcFile):
+		shutil.copyfile(srcFile,tgtFile)													# no better, use the original.
+
+#
+#	Copies sounds, converting them with ffmpeg. File names and types stay the same so nothing in the app has to
+#	change. Whether a sound is a short effect or music is decided by its length (see convertSound()), and
+#	conversions are only kept if they make it smaller. If ffmpeg or ffprobe isn't installed they are copied.
+#
+#	Converted files are kept in the content cache keyed on the source hash and the settings, so each sound is only
+#	converted once.
+#
+class AudioCopier(FileCopier):
+	def __init__(self,source,workers = 1,cache = None,effectRate = 22050,musicBitrate = "96k",silence = -60,pool = None,effectLength = 5.0):
+		FileCopier.__init__(self,source,workers,False,cache)
+		self.pool = pool 																	# shared worker pool, if any.
+		self.effectRate = effectRate 														# sample rate of effects.
+		self.musicBitrate = musicBitrate 													# bit rate of mp3s.
+		self.silence = silence 																# level trimmed (dB)
+		self.effectLength = effectLength 													# seconds, longer is music.
+		self.ffmpeg = shutil.which("ffmpeg")
+		self.ffprobe = shutil.which("ffprobe")
+		if self.ffmpeg is None or self.ffprobe is None:
+			print("        Warning : ffmpeg/ffprobe not found, sounds copied without conversion.")
+			self.ffmpeg = None
+
+	def generator(self):
+		if self.ffmpeg is None:
+			return FileCopier.generator(self)+":copy"
+		return FileCopier.generator(self)+":2:{0}:{1}:{2}:{3}".format(self.effectRate,self.musicBitrate,self.silence,self.effectLength)
+
+	def isCurrent(self,srcFile,outFile):													# converted, so can only check it is newer
+		if self.ffmpeg is None:
+			return FileCopier.isCurrent(self,srcFile,outFile)
+		return os.path.isfile(outFile) and os.stat(outFile).st_mtime >= os.stat(srcFile).st_mtime
+
+	#
+	#	Copying is done by ffmpeg, so the thread pool of the FileCopier runs that many ffmpeg processes at once, or
+	#	if there is a shared pool, as many as it has free workers.
+	#
+	def copyFile(self,srcFile,tgtFile):
+		if self.ffmpeg is None:
+			FileCopier.copyFile(self,srcFile,tgtFile)
+			return
+		if self.cache is None:
+			self.convert(srcFile,tgtFile)
+			return
+		extension = os.path.splitext(tgtFile)[1].lower()
+		key = self.cacheKey(srcFile)
+		if not self.cache.has(key,extension):
+			self.cache.write(key,extension,lambda tempName: self.convert(srcFile,tempName))
+		fastCopy(self.cache.fileName(key,extension),tgtFile,True)
+
+	def convert(self,srcFile,tgtFile):
+		settings = (self.ffmpeg,self.ffprobe,srcFile,tgtFile,self.effectRate,self.musicBitrate,self.silence,self.effectLength)
+		if self.pool is None:
+			convertSound(*settings)
+		else:
+			self.pool.submit(convertSound,*settings).result()
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	Conversion done by convertSound(), in the shared worker pool if there is one.
+#		18 Oct 26 	Effects and music told apart by length (ffprobe) ; mp3s only re-encoded above musicBitrate.
+# 
+#  ****************************************************************************************************************
@@ -0,0 +1,146 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		binpacker.py
+# 		Purpose:	Packs rectangles (glyphs, sprites) into as few and as small texture pages as possible.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+#
+#	MaxRects packer for a single page. Keeps a list of the free rectangles (which may overlap) and places each new
+#	rectangle in the free rectangle where it fits with the shortest leftover side. Rectangles are not rotated.
+#
+class MaxRectsPacker:
+	def __init__(self,width,height):
+		self.width = width 																# size of page
+		self.height = height
+		self.freeRects = [ (0,0,width,height) ]											# (x,y,width,height) free
+
+	#
+	#	Place a rectangle, returns (x,y) or None if it doesn't fit.
+	#
+	def insert(self,width,height):
+		best = None
+		bestScore = None
+		for fx,fy,fw,fh in self.freeRects:
+			if width <= fw and height <= fh:
+				score = (min(fw-width,fh-height),max(fw-width,fh-height))				# best short side fit
+				if bestScore is None or score < bestScore:
+					best = (fx,fy)
+					bestScore = score
+		if best is None:
+			return None
+		placed = (best[0],best[1],width,height)
+		newFree = []
+		for free in self.freeRects:														# split anything it overlaps.
+			newFree += self.split(free,placed)
+		self.freeRects = self.prune(newFree)
+		return best
+
+	#
+	#	Split a free rectangle around a used one, giving the up to four maximal free rectangles left.
+	#
+	def split(self,free,used):
+		fx,fy,fw,fh = free
+		ux,uy,uw,uh = used
+		if ux >= fx+fw or ux+uw <= fx or uy >= fy+fh or uy+uh <= fy:						# doesn't overlap
+			return [free]
+		result = []
+		if ux > fx:																		# left part
+			result.append((fx,fy,ux-fx,fh))
+		if ux+uw < fx+fw:																# right part
+			result.append((ux+uw,fy,fx+fw-ux-uw,fh))
+		if uy > fy:																		# top part
+			result.append((fx,fy,fw,uy-fy))
+		if uy+uh < fy+fh:																# bottom part
+			result.append((fx,uy+uh,fw,fy+fh-uy-uh))
+		return result
+
+	#
+	#	Remove free rectangles which are inside another one.
+	#
+	def prune(self,rects):
+		rects = sorted(set(rects),key = lambda r: -r[2]*r[3])							# biggest first
+		result = []
+		for r in rects:
+			contained = False
+			for o in result:
+				if r[0] >= o[0] and r[1] >= o[1] and r[0]+r[2] <= o[0]+o[2] and r[1]+r[3] <= o[1]+o[3]:
+					contained = True
+					break
+			if not contained:
+				result.append(r)
+		return result
+
+#
+#	Pack a dictionary of key => (width,height) into pages no bigger than maxSize square. Each rectangle has padding
+#	pixels kept clear to its right and bottom (and the page has padding round the top/left edge). If powerOfTwo
+#	is set the pages have power of two sizes, otherwise they are cut down to what is used.
+#
+#	Returns a list of pages, each being { "size":(width,height), "placed":{ key:(x,y,width,height) } }
+#
+def packRectangles(rectangles,maxSize = 2048,padding = 2,powerOfTwo = True):
+	keys = sorted(rectangles.keys(),key = lambda k: (-max(rectangles[k]),-min(rectangles[k]),str(k)))
+	for k in keys:																		# check all will fit on a page
+		assert rectangles[k][0]+padding*2 <= maxSize and rectangles[k][1]+padding*2 <= maxSize,"Too big for page "+str(k)
+	pages = []
+	while len(keys) > 0:
+		area = sum([(rectangles[k][0]+padding)*(rectangles[k][1]+padding) for k in keys])
+		side = max([max(rectangles[k])+padding*2 for k in keys])
+		width = height = min(maxSize,roundUp(side,powerOfTwo))							# smallest page the biggest fits
+		while width * height < area and (width < maxSize or height < maxSize):			# grow until there's enough room
+			width,height = growPage(width,height,maxSize,powerOfTwo)
+		while True:
+			placed,left = packPage(keys,rectangles,width,height,padding)
+			if len(left) == 0 or (width >= maxSize and height >= maxSize):				# all in, or as big as can be.
+				break
+			width,height = growPage(width,height,maxSize,powerOfTwo)
+		if not powerOfTwo:																# cut down to what is used.
+			width = max([p[0]+p[2] for p in placed.values()])+padding
+			height = max([p[1]+p[3] for p in placed.values()])+padding
+		pages.append({ "size":(width,height), "placed":placed })
+		keys = left 																	# anything left goes on the next page.
+	return pages
+
+#
+#	Pack as many as will fit on one page, returns placed dictionary and list of keys left over.
+#
+def packPage(keys,rectangles,width,height,padding):
+	packer = MaxRectsPacker(width-padding,height-padding)
+	placed = {}
+	left = []
+	for k in keys:
+		position = packer.insert(rectangles[k][0]+padding,rectangles[k][1]+padding)
+		if position is None:
+			left.append(k)
+		else:
+			placed[k] = (position[0]+padding,position[1]+padding,rectangles[k][0],rectangles[k][1])
+	return placed,left
+
+#
+#	Make a page bigger, alternating width and height.
+#
+def growPage(width,height,maxSize,powerOfTwo):
+	if (width <= height and width < maxSize) or height >= maxSize:
+		width = min(maxSize,roundUp(width+1,powerOfTwo) if powerOfTwo else int(width*1.1)+1)
+	else:
+		height = min(maxSize,roundUp(height+1,powerOfTwo) if powerOfTwo else int(height*1.1)+1)
+	return width,height
+
+def roundUp(size,powerOfTwo):
+	if not powerOfTwo:
+		return size
+	n = 1
+	while n < size:
+		n = n * 2
+	return n
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+# 
+#  ****************************************************************************************************************
@@ -0,0 +1,141 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		buildprofiler.py
+# 		Purpose:	Records where the time and memory go in a resource build.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+import os,sys,time,json,contextlib
+from libraries.scheduler import TimedPool
+
+try:
+	import resource 																	# not available on Windows.
+except ImportError:
+	resource = None
+
+#
+#	Peak memory (resident set size) in bytes so far, of this process and of the largest child process (e.g.
+#	rendering workers), or None if it can't be found.
+#
+def peakMemory():
+	if resource is None:
+		return None
+	scale = 1 if sys.platform == "darwin" else 1024 									# Linux reports Kb, macOS bytes.
+	return { "self":resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+			 "children":resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale }
+
+#
+#	CPU time used so far by this process and its children (worker processes) that have finished.
+#
+def cpuTime():
+	t = os.times()
+	return t.user + t.system + t.children_user + t.children_system
+
+#
+#	Record of one stage.
+#
+class BuildStage:
+	def __init__(self,name):
+		self.name = name
+		self.started = time.time()
+		self.wallTime = 0.0
+		self.cpuTime = 0.0
+		self.peakMemory = None
+		self.files = [] 																# (file,seconds,bytes)
+		self.pools = [] 																# TimedPools of its jobs.
+
+	#
+	#	The shared worker pool for the stage to use, which times its jobs ; None if there isn't one.
+	#
+	def pool(self,shared):
+		if shared is None:
+			return None
+		self.pools.append(TimedPool(shared))
+		return self.pools[-1]
+
+	def addFiles(self,timings):															# list of (file,seconds,bytes)
+		self.files += timings
+
+	def addOutputs(self,fileNames):														# files whose cost is not known,
+		for f in fileNames:																# if written during this stage.
+			if os.path.isfile(f) and os.path.getmtime(f) >= self.started:
+				self.files.append((f,None,os.path.getsize(f)))
+
+	def toDictionary(self):
+		return { "name":self.name, "wallTime":self.wallTime, "cpuTime":self.cpuTime, "peakMemory":self.peakMemory,
+				 "filesProcessed":len(self.files), "bytesWritten":sum([f[2] for f in self.files]),
+				 "files":[{ "file":f[0], "seconds":f[1], "bytes":f[2] } for f in self.files] }
+
+#
+#	Profiles a build, stage by stage. Use as
+#
+#		with profiler.stage("name") as stage:
+#			... work ...
+#			stage.addFiles(timings)
+#
+#	Peak memory is the peak so far when the stage finishes, as the operating system only gives a high water mark.
+#
+#	If stages run at the same time (concurrent is set) the CPU time of the process isn't any one stage's, so a
+#	stage's CPU time is that of its own thread and the jobs it ran in the shared worker pool (see pool()) ; threads
+#	it starts itself aren't counted. Memory is only known for the whole process so isn't recorded for each stage,
+#	which needs -j1.
+#
+class BuildProfiler:
+	def __init__(self):
+		self.stages = []
+		self.started = time.time()
+		self.concurrent = False 														# stages overlap.
+
+	@contextlib.contextmanager
+	def stage(self,name):
+		stage = BuildStage(name)
+		self.stages.append(stage)
+		cpuStart = cpuTime()
+		threadStart = time.thread_time()
+		try:
+			yield stage
+		finally:
+			stage.wallTime = time.time() - stage.started
+			if not self.concurrent:
+				stage.cpuTime = cpuTime() - cpuStart
+				stage.peakMemory = peakMemory()
+			else:
+				stage.cpuTime = time.thread_time() - threadStart + sum([p.cpuTime for p in stage.pools])
+
+	#
+	#	One line per stage.
+	#
+	def summary(self):
+		lines = []
+		for s in self.stages:
+			d = s.toDictionary()
+			lines.append("{0:18}: {1:7.3f}s wall {2:7.3f}s cpu {3:5} files {4:10} bytes".format(s.name,s.wallTime,s.cpuTime,d["filesProcessed"],d["bytesWritten"]))
+		if self.concurrent:
+			lines.append("{0:18}: {1:7.3f}s wall (stages run at the same time, memory for each needs -j1)".format("build",time.time()-self.started))
+		return "\n".join(lines)
+
+	#
+	#	Write the report as JSON.
+	#
+	def save(self,fileName):
+		directory = os.path.dirname(fileName)
+		if directory != "" and not os.path.isdir(directory):
+			os.makedirs(directory)
+		report = { "started":self.started, "wallTime":time.time()-self.started,
+				   "peakMemory":peakMemory(), "concurrent":self.concurrent, "stages":[s.toDictionary() for s in self.stages] }
+		if self.concurrent:
+			report["note"] = "Stages ran at the same time : cpuTime is the stage's thread and its worker jobs, peakMemory for each stage needs -j1."
+		json.dump(report,open(fileName,"w"),indent = 1)
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	CPU time and memory not given for each stage when stages run at the same time.
+#		18 Oct 26 	Stages running at the same time have CPU time from their thread and worker jobs.
+# 
+#  ****************************************************************************************************************
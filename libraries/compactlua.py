@@ -0,0 +1,235 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		compactlua.py
+# 		Purpose:	Writes data as small Lua which is quick to load (shared strings, records), optionally compiled.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+import os,re,shutil,subprocess
+from libraries.formatter import LuaFormatter
+
+#
+#	Lua 5.1 allows 200 locals in a function, but the locals also use up registers (250 of them) which are needed
+#	to build nested tables (up to 50 each), so only this many strings are made locals.
+#
+MAXLOCALS = 100
+
+#
+#	Builds a table of records from a list of keys and rows of values, adding them to t if it is given.
+#
+RECORDS = "local function R(k,r,t)t=t or{}for n,v in pairs(r)do local e={}for i=1,#k do e[k[i]]=v[i]end t[n]=e end return t end\n"
+
+#
+#	Names for the shared string locals, a..z A..Z then two letters and so on. R is the records function.
+#
+def localNames():
+	letters = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+	names = list(letters)
+	while True:
+		for n in names:
+			if n != "R" and n not in LuaFormatter.keywords:
+				yield n
+		names = [n+c for n in names for c in letters]
+
+def isScalar(value):
+	return value is None or isinstance(value,(str,int,float,bool))
+
+#
+#	Writes the same tables as LuaFormatter, as a module which is smaller and quicker to parse :
+#
+#		Strings used often enough (keys or values) are made locals, so they are only in the file once.
+#		Tables of tables which all have the same keys (e.g. the sections of a data file, or a list of records)
+#		are written as a list of keys and a row of values for each, built into tables by R() when loaded.
+#		There is no white space.
+#
+class CompactLuaWriter:
+	VERSION = 1 																		# change if the output changes.
+
+	def __init__(self):
+		self.formatter = LuaFormatter(True)
+
+	def write(self,stream,data):
+		self.usesRecords = False
+		plan = self.plan(data)
+		self.costs = {} 																	# string => [bytes written,uses,order]
+		self.count(plan)
+		self.names = self.chooseLocals()
+		pieces = []
+		self.emit(plan,pieces)
+		if len(self.names) > 0:
+			strings = sorted(self.names.keys(),key = lambda s: self.costs[s][2])
+			stream.write("local "+",".join([self.names[s] for s in strings])+"="+",".join([self.formatter.formatString(s) for s in strings])+"\n")
+		if self.usesRecords:
+			stream.write(RECORDS)
+		stream.write("return "+"".join(pieces))
+
+	#
+	#	Work out how to lay out each table : ("table",[(key,plan)]), ("list",[plan]), ("records",keys,rows,rest)
+	#	where rows is [(key or None,[values])] and rest is a table plan of anything which isn't a record, or
+	#	("scalar",value)
+	#
+	def plan(self,value):
+		if isinstance(value,dict):
+			keys = self.sortedKeys(value)
+			shapes = {}
+			for k in keys:
+				shape = self.shape(value[k])
+				if shape is not None:
+					shapes[shape] = shapes.get(shape,0) + 1
+			best = max(shapes.keys(),key = lambda s: shapes[s]) if len(shapes) > 0 else None
+			if best is None or shapes[best] < 2:
+				return ("table",[(k,self.plan(value[k])) for k in keys])
+			rows = [(k,[value[k].get(f) for f in best]) for k in keys if self.shape(value[k]) == best]
+			rest = [(k,self.plan(value[k])) for k in keys if self.shape(value[k]) != best]
+			self.usesRecords = True
+			return ("records",list(best),rows,("table",rest) if len(rest) > 0 else None)
+		if isinstance(value,(list,tuple)):
+			shapes = set([self.shape(v) for v in value])
+			if len(value) >= 2 and len(shapes) == 1 and None not in shapes:
+				keys = list(shapes.pop())
+				self.usesRecords = True
+				return ("records",keys,[(None,[v[f] for f in keys]) for v in value],None)
+			return ("list",[self.plan(v) for v in value])
+		return ("scalar",value)
+
+	def sortedKeys(self,value):
+		try:
+			return sorted(value)
+		except TypeError: 																# mixed types of key
+			return sorted(value,key = str)
+
+	#
+	#	The keys of a table which can be a record (two or more string keys, scalar values), or None.
+	#
+	def shape(self,value):
+		if not isinstance(value,dict) or len(value) < 2:
+			return None
+		for k,v in value.items():
+			if not isinstance(k,str) or LuaFormatter.bracketed.match(k) is not None or not isScalar(v):
+				return None
+		return tuple(sorted(value))
+
+	#
+	#	Add up how many bytes each string takes and how often it is used. A key is counted as the bytes of the
+	#	key as written less the [] it would need as a local.
+	#
+	def count(self,plan):
+		kind = plan[0]
+		if kind == "scalar":
+			self.countString(plan[1],0)
+		elif kind == "list":
+			for p in plan[1]:
+				self.count(p)
+		elif kind == "table":
+			for k,p in plan[1]:
+				if isinstance(k,str) and LuaFormatter.bracketed.match(k) is None:
+					self.countString(k,len(self.formatter.formatKey(k)) - 2 - len(self.formatter.formatString(k)))
+				self.count(p)
+		else:
+			for k in plan[1]:
+				self.countString(k,0)
+			for k,row in plan[2]:
+				if k is not None:
+					self.countString(k,len(self.formatter.formatKey(k)) - 2 - len(self.formatter.formatString(k)))
+				for v in row:
+					self.countString(v,0)
+			if plan[3] is not None:
+				self.count(plan[3])
+
+	def countString(self,value,adjust):
+		if isinstance(value,str):
+			cost = self.costs.get(value)
+			if cost is None:
+				cost = self.costs[value] = [0,0,len(self.costs)] 						# bytes, uses, first seen
+			cost[0] += len(self.formatter.formatString(value)) + adjust
+			cost[1] += 1
+
+	#
+	#	Pick the strings which save the most by being locals, giving the shortest names to the most used. A local
+	#	costs its name at each use, and its name and the string once where it is declared.
+	#
+	def chooseLocals(self):
+		saving = lambda s,size: self.costs[s][0] - self.costs[s][1]*size - len(self.formatter.formatString(s)) - size - 2
+		candidates = sorted([s for s in self.costs.keys() if saving(s,2) > 0],key = lambda s: -saving(s,1))
+		names = {}
+		generator = localNames()
+		for s in candidates[:MAXLOCALS]:
+			name = next(generator)
+			if saving(s,len(name)) > 0:
+				names[s] = name
+		return names
+
+	#
+	#	Write a plan out as Lua
+	#
+	def emit(self,plan,out):
+		kind = plan[0]
+		if kind == "scalar":
+			out.append(self.value(plan[1]))
+		elif kind == "list":
+			out.append("{")
+			for n,p in enumerate(plan[1]):
+				out.append("," if n > 0 else "")
+				self.emit(p,out)
+			out.append("}")
+		elif kind == "table":
+			out.append("{")
+			for n,(k,p) in enumerate(plan[1]):
+				out.append(("," if n > 0 else "")+self.key(k)+"=")
+				self.emit(p,out)
+			out.append("}")
+		else:
+			out.append("R({"+",".join([self.value(k) for k in plan[1]])+"},{")
+			for n,(k,row) in enumerate(plan[2]):
+				while len(row) > 0 and row[-1] is None: 								# trailing nils not needed.
+					row = row[:-1]
+				out.append(("," if n > 0 else "")+("" if k is None else self.key(k)+"=")+"{"+",".join([self.value(v) for v in row])+"}")
+			out.append("}")
+			if plan[3] is not None:
+				out.append(",")
+				self.emit(plan[3],out)
+			out.append(")")
+
+	def value(self,value):
+		if isinstance(value,str) and value in self.names:
+			return self.names[value]
+		return self.formatter.formatScalar(value)
+
+	def key(self,key):
+		if isinstance(key,str) and key in self.names and LuaFormatter.bracketed.match(key) is None:
+			return "["+self.names[key]+"]"
+		return self.formatter.formatKey(key)
+
+#
+#	Find a Lua 5.1 (as used by Corona) compiler, None if there isn't one.
+#
+def findLuac():
+	for name in ["luac5.1","luac"]:
+		luac = shutil.which(name)
+		if luac is not None:
+			result = subprocess.run([luac,"-v"],stdout = subprocess.PIPE,stderr = subprocess.STDOUT)
+			if re.search(r"Lua 5\.1",result.stdout.decode("utf-8","replace")) is not None:
+				return luac
+	return None
+
+#
+#	Compile a Lua file to bytecode in place, stripping debugging information. require() loads either.
+#
+def compileLua(luac,fileName):
+	result = subprocess.run([luac,"-s","-o",fileName+".luac",fileName],stdout = subprocess.PIPE,stderr = subprocess.PIPE)
+	if result.returncode != 0:
+		raise RuntimeError("luac failed on "+fileName+" : "+result.stderr.decode("utf-8","replace"))
+	os.replace(fileName+".luac",fileName)
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	luac failing raises a RuntimeError.
+#		18 Oct 26 	VERSION of the output, for the build manifest.
+# 
+#  ****************************************************************************************************************
@@ -19,8 +19,9 @@ from libraries.formatter import LuaFormatter
 #	Note Starter/Basic does not allow inmobi to be used.
 #
 class ConfigGenerator:
-	def __init__(self,orientation):
+	def __init__(self,orientation,imageSuffixes = None):
 		self.orientation = orientation.lower()												# save the orientation and check it
+		self.imageSuffixes = imageSuffixes or {} 											# e.g. { "@2x":1.5 }
 		assert self.orientation == "portrait" or self.orientation == "landscape"
 		self.reqInfo = RequiredFilesInformation(self.orientation) 							# instance of required files information.
 		self.formatter = LuaFormatter() 													# instance of formatting object.
@@ -28,9 +29,16 @@ class ConfigGenerator:
 	#
 	#	Generate config.lua and build.settings
 	#
-	def generate(self,directory,advertList):
+	def generate(self,directory,advertList,manifest = None):
+		outputs = [directory+os.sep+"config.lua",directory+os.sep+"build.settings"]
+		generator = "ConfigGenerator:1:"+str(LuaFormatter.VERSION)+":"+self.reqInfo.version()+":"+self.orientation+":"+advertList+":"+str(sorted(self.imageSuffixes.items()))
+		if manifest is not None and manifest.isCurrent(outputs[1],[self.reqInfo.fileName()],outputs,generator):
+			return self 																	# nothing changed.
 		self.generateConfigLua(directory)													# create config.lua
 		self.generateBuildSettings(directory,advertList)									# create build.settings
+		if manifest is not None:
+			manifest.record(outputs[1],[self.reqInfo.fileName()],outputs,generator)
+		return self
 
 	#
 	#	Get required android permissions.
@@ -50,6 +58,8 @@ class ConfigGenerator:
 	#
 	def generateConfigLua(self,directory):													# create config.lua
 		application = { "content" : { "width" : 640, "height" : 960, "scale" : "letterbox" }}
+		if len(self.imageSuffixes) > 0: 													# images at other densities
+			application["content"]["imageSuffix"] = self.imageSuffixes
 
 		configLua = self.formatter.luaFormat(0,"application",application)
 		open(directory+os.sep+"config.lua","w").write(configLua)
@@ -128,5 +138,9 @@ class ConfigGenerator:
 # 		Date		Changes Made
 #		----		------------
 #		31 Dec 14 	First working version.
+#		18 Oct 26 	generate() skips if the build manifest says config.lua/build.settings are current.
+#		18 Oct 26 	imageSuffix in config.lua for graphics at other densities.
+#		18 Oct 26 	requiredfiles.json is a source, and its version part of the generator.
+#		18 Oct 26 	Build manifest generator includes the LuaFormatter VERSION.
 # 
 #  ****************************************************************************************************************
\ No newline at end of file
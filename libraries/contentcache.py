@@ -0,0 +1,120 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		contentcache.py
+# 		Purpose:	Content addressed on-disk cache for things that are expensive to produce.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+import os,time,shutil,hashlib,threading
+
+#
+#	Files are stored under a key made from whatever determines their content (usually the hash of the source
+#	file and the settings used) so a hit can be used without checking anything else. Files are written to a
+#	temporary name and renamed into place, so several processes can share one cache safely.
+#
+#	Nothing is ever out of date, but the cache would grow for ever, so prune() removes files which haven't been used
+#	for maxAge seconds, then the least recently used until it is no bigger than maxBytes. Using a file sets its
+#	access time, which prune() goes by ; the modification time is left alone, as files may be linked from a build.
+#
+class ContentCache:
+	MAXBYTES = 1024*1024*1024 															# default limits for prune()
+	MAXAGE = 30*24*60*60
+
+	def __init__(self,directory):
+		self.directory = directory 														# where the cache lives.
+		if not os.path.isdir(directory):
+			os.makedirs(directory,exist_ok = True)
+
+	#
+	#	Make a key from the things which determine the content.
+	#
+	def key(self,*parts):
+		return hashlib.sha1("\0".join([str(p) for p in parts]).encode("utf-8")).hexdigest()
+
+	#
+	#	Name of the cache file for a key, split into subdirectories so no directory gets too big.
+	#
+	def fileName(self,key,extension):
+		return self.directory+os.sep+key[:2]+os.sep+key+extension
+
+	def has(self,key,extension):
+		if not os.path.isfile(self.fileName(key,extension)):
+			return False
+		self.used(self.fileName(key,extension))
+		return True
+
+	def used(self,fileName):
+		try:
+			os.utime(fileName,(time.time(),os.stat(fileName).st_mtime))
+		except OSError: 																	# pruned, or read only.
+			pass
+
+	#
+	#	Copy a cached file to the target, returns False if it is not in the cache.
+	#
+	def fetch(self,key,extension,tgtFile):
+		if not self.has(key,extension):
+			return False
+		shutil.copyfile(self.fileName(key,extension),tgtFile)
+		return True
+
+	#
+	#	Put a file into the cache. writer is called with a file name to write the content to, e.g. image.save
+	#
+	def write(self,key,extension,writer):
+		fileName = self.fileName(key,extension)
+		if not os.path.isdir(os.path.dirname(fileName)):
+			os.makedirs(os.path.dirname(fileName),exist_ok = True)
+		unique = "-"+str(os.getpid())+"-"+str(threading.get_ident())						# unique to this process/thread
+		tempName = fileName[:len(fileName)-len(extension)]+unique+".tmp"+extension
+		writer(tempName)
+		os.replace(tempName,fileName) 													# atomic, last one in wins.
+		return fileName
+
+	#
+	#	Put a copy of an existing file into the cache.
+	#
+	def store(self,key,extension,srcFile):
+		return self.write(key,extension,lambda tempName: shutil.copyfile(srcFile,tempName))
+
+	#
+	#	Remove files not used for maxAge seconds, then the least recently used until there are no more than maxBytes.
+	#	Returns the number of files and bytes removed. Should only be run when nothing else is using the cache.
+	#
+	def prune(self,maxBytes = None,maxAge = None):
+		maxBytes = ContentCache.MAXBYTES if maxBytes is None else maxBytes
+		maxAge = ContentCache.MAXAGE if maxAge is None else maxAge
+		files = []
+		for root,dirs,names in os.walk(self.directory):
+			for f in names:
+				try:
+					stat = os.stat(root+os.sep+f)
+					files.append((max(stat.st_atime,stat.st_mtime),stat.st_size,root+os.sep+f))
+				except OSError:
+					pass
+		files.sort() 																	# least recently used first.
+		total = sum([f[1] for f in files])
+		now = time.time()
+		removed = [0,0]
+		for lastUsed,size,fileName in files:
+			if total <= maxBytes and now-lastUsed < maxAge:
+				break
+			try:
+				os.remove(fileName)
+			except OSError:
+				continue
+			total -= size
+			removed = [removed[0]+1,removed[1]+size]
+		return tuple(removed)
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	prune() by age and size, files used set their access time.
+# 
+#  ****************************************************************************************************************
@@ -9,28 +9,187 @@
 #  ****************************************************************************************************************
 #  ****************************************************************************************************************
 
-import os,shutil
+import os,time,shutil
+from concurrent.futures import ThreadPoolExecutor
+from libraries.manifest import hashFile
 
+FICLONE = 0x40049409 																# Linux ioctl to clone (reflink) a file.
+
+#
+#	Copy a file as cheaply as the filesystem allows. If hardLink is set, a hard link is used if possible. Otherwise
+#	try a reflink (btrfs/XFS share the data), then a kernel side copy, then an ordinary copy. The target is removed
+#	first so that a target which is a hard link is never written through to its source.
+#
+def fastCopy(srcFile,tgtFile,hardLink = False):
+	if os.path.lexists(tgtFile):
+		os.remove(tgtFile)
+	if hardLink:
+		try:
+			os.link(srcFile,tgtFile)
+			return
+		except OSError:																# different device, not supported etc.
+			pass
+	with open(srcFile,"rb") as src,open(tgtFile,"wb") as tgt:
+		try:
+			import fcntl
+			fcntl.ioctl(tgt.fileno(),FICLONE,src.fileno()) 							# reflink, no data copied at all.
+			return
+		except (ImportError,OSError):
+			pass
+		if hasattr(os,"copy_file_range"): 											# kernel does the copy.
+			try:
+				size = os.fstat(src.fileno()).st_size
+				copied = 0
+				while copied < size:
+					count = os.copy_file_range(src.fileno(),tgt.fileno(),size-copied)
+					if count == 0:
+						break
+					copied += count
+				if copied == size:
+					return
+				src.seek(copied)													# finish it off the usual way.
+				tgt.seek(copied)
+			except OSError:
+				src.seek(0)
+				tgt.seek(0)
+				tgt.truncate()
+		shutil.copyfileobj(src,tgt,1024*1024)
+
+#
+#	Copies all files of given types from a source directory tree into a target directory. Copies are done on a pool
+#	of worker threads, and files whose target is unchanged are skipped, either using the build manifest (content
+#	hash) if one is given or if the target has the same size and modification time as the source.
+#
+#	If a content cache (shared by several apps) is given, files are put in the cache and linked from there, so
+#	many apps with the same sound banks only have one copy of them.
+#
 class FileCopier:
-	def __init__(self,source):
+	def __init__(self,source,workers = 1,hardLink = False,cache = None):
 		self.source = source														# save where its coming from.
+		self.workers = max(1,workers or 1)											# number of copying threads.
+		self.hardLink = hardLink 													# hard link rather than copy.
+		self.cache = cache 															# shared ContentCache or None
+		self.filesCopied = 0 														# statistics for this copy.
+		self.bytesCopied = 0
+		self.filesSkipped = 0
+		self.bytesSkipped = 0
+		self.timings = [] 															# (file,seconds,bytes) for each copy.
+
+	def copy(self,types,target,manifest = None):
+		self.transfer(self.scan(types,target),manifest)								# work out what to do and do it.
+		return self
 
-	def copy(self,types,target):
+	#
+	#	Get a list of (source,target) pairs to copy.
+	#
+	def scan(self,types,target):
 		self.typeList = "."+(".".join(types))+"."									# list of . seperated supported types.
+		jobs = []
 		for root,dirs,files in os.walk(self.source):								# look through the directory.
 			for f in files:															# scan through files
 				fullName = root + os.sep + f 										# full name of file
 				if self.typeList.find("."+fullName[-3:].lower()+".") >= 0:			# does it pass the target test.
 					if fullName.lower() != fullName:								# check the case is correct. 
 						print('        Warning : filename "'+fullName+'" is not all lower case.')
-					self.copyFile(fullName,target+os.sep+f.lower())					# copy the file
+					jobs.append((fullName,target+os.sep+f.lower()))
+		return jobs
+
+	#
+	#	Copy all the files which have changed.
+	#
+	def transfer(self,jobs,manifest = None):
+		generator = self.generator()												# what produced the copy.
+		changed = []
+		for srcFile,tgtFile in jobs:												# find out what needs doing.
+			outFile = self.targetFile(tgtFile)										# what actually gets written.
+			if manifest is not None:
+				current = manifest.isCurrent(outFile,[srcFile],[outFile],generator)
+			else:
+				current = self.isCurrent(srcFile,outFile)
+			if current:
+				self.filesSkipped += 1
+				self.bytesSkipped += os.path.getsize(srcFile)
+			else:
+				changed.append((srcFile,tgtFile))
+		self.copyAll(changed)														# copy the files
+		for srcFile,tgtFile in changed:												# update statistics and manifest.
+			self.filesCopied += 1
+			self.bytesCopied += os.path.getsize(srcFile)
+			if manifest is not None:
+				outFile = self.targetFile(tgtFile)
+				manifest.record(outFile,[srcFile],[outFile],generator)
+
+	#
+	#	Copy a list of (source,target) pairs, using the thread pool if there is more than one worker.
+	#
+	def copyAll(self,jobs):
+		if self.workers > 1 and len(jobs) > 1:
+			with ThreadPoolExecutor(max_workers = self.workers) as pool:
+				for job in [pool.submit(self.timedCopy,s,t) for s,t in jobs]:		# wait for them, raising any errors.
+					job.result()
+		else:
+			for srcFile,tgtFile in jobs:
+				self.timedCopy(srcFile,tgtFile)
+
+	#
+	#	Copy a file, keeping the time taken and the size written in timings.
+	#
+	def timedCopy(self,srcFile,tgtFile):
+		start = time.time()
+		self.copyFile(srcFile,tgtFile)
+		outFile = self.targetFile(tgtFile)
+		self.timings.append((outFile,time.time()-start,os.path.getsize(outFile)))
+
+	#
+	#	Check if a target is current without a manifest ; copies keep the modification time of the source.
+	#
+	def isCurrent(self,srcFile,outFile):
+		if not os.path.isfile(outFile):
+			return False
+		srcStat = os.stat(srcFile)
+		outStat = os.stat(outFile)
+		return srcStat.st_size == outStat.st_size and srcStat.st_mtime == outStat.st_mtime
+
+	def generator(self):															# identifies how the copy is done.
+		return self.__class__.__name__+":1"
+
+	def targetFile(self,tgtFile):													# name of file copyFile() creates
+		return tgtFile
+
+	#
+	#	Key of the cached result of a file, which depends on its content and how it is copied.
+	#
+	def cacheKey(self,srcFile):
+		return self.cache.key(self.generator(),hashFile(srcFile))
 
 	def copyFile(self,srcFile,tgtFile):
-		shutil.copyfile(srcFile,tgtFile)											# this is just a simple copy.
+		if self.cache is not None:													# copy via the cache
+			extension = os.path.splitext(tgtFile)[1]
+			key = self.cacheKey(srcFile)
+			if not self.cache.has(key,extension):
+				self.cache.store(key,extension,srcFile)
+			fastCopy(self.cache.fileName(key,extension),tgtFile,True)
+			if not os.path.samefile(self.cache.fileName(key,extension),tgtFile):
+				shutil.copystat(srcFile,tgtFile)
+			return
+		fastCopy(srcFile,tgtFile,self.hardLink)										# this is just a simple copy.
+		if not self.hardLink or not os.path.samefile(srcFile,tgtFile):
+			shutil.copystat(srcFile,tgtFile)										# keep the time for isCurrent()
+
+	#
+	#	Summary of what the last copy did.
+	#
+	def report(self):
+		return "{0} files ({1} bytes) copied, {2} files ({3} bytes) unchanged".format(self.filesCopied,self.bytesCopied,self.filesSkipped,self.bytesSkipped)
 
 #  ****************************************************************************************************************
 # 		Date		Changes Made
 #		----		------------
 #		14 Jan 15 	First working version.
+#		18 Oct 26 	Files unchanged since the last build (per the build manifest) are not copied again.
+#		18 Oct 26 	Copies on a thread pool using hard links/reflinks/kernel copies, unchanged files skipped,
+#					statistics available through report()
+#		18 Oct 26 	Time and size of each file copied kept in timings.
+#		18 Oct 26 	Optional shared content cache, files are linked from it.
 # 
 #  ****************************************************************************************************************
\ No newline at end of file
@@ -9,67 +9,395 @@
 #  ****************************************************************************************************************
 #  ****************************************************************************************************************
 
-import os,re
+import os,re,io,time,struct,shutil,subprocess,collections
+import xml.etree.ElementTree as xml
+from libraries.scheduler import processPool
+from concurrent.futures import wait,FIRST_COMPLETED
 from PIL import Image
 from libraries.reqfiles import RequiredFilesInformation 
+from libraries.contentcache import ContentCache
+from libraries.manifest import hashFile
 
 #
-#	Class responsible for scaling/generation of launch images and application icons.
+#	SVG masters need either the cairosvg module or the rsvg-convert program. If neither is available they are
+#	ignored and the PNG masters are used as before.
+#
+try:
+	import cairosvg
+except (ImportError,OSError):															# OSError if the cairo library is missing
+	cairosvg = None
+
+def svgRasteriser():
+	if cairosvg is not None:
+		return "cairosvg"
+	if shutil.which("rsvg-convert") is not None:
+		return "rsvg-convert"
+	return None
+
+#
+#	Get the size of a PNG from its header, without decoding it.
+#
+def pngSize(fileName):
+	with open(fileName,"rb") as f:
+		header = f.read(24)																# signature, IHDR length and name, width, height
+	assert header[:8] == b"\x89PNG\r\n\x1a\n" and header[12:16] == b"IHDR","Not a PNG file "+fileName
+	return struct.unpack(">II",header[16:24])
+
+#
+#	Load an image completely, which also closes the file.
+#
+def loadImage(fileName):
+	image = Image.open(fileName)
+	image.load()
+	return image
+
+#
+#	Scale a source image to a square of the given size. If there is a disk cache the scaled image is kept there,
+#	keyed on the hash of the source file and the size, so later builds do not have to resample it again. The
+#	source is a function returning the image, so it is not loaded at all if the cache has it.
+#
+def scaleImage(source,squareSz,cache = None,sourceHash = None):
+	if cache is not None:
+		key = cache.key("scaled",sourceHash,squareSz)
+		if cache.has(key,".png"):														# already done it in an earlier build.
+			return loadImage(cache.fileName(key,".png"))
+	resImg = source().resize((squareSz,squareSz),resample=Image.BICUBIC)				# resize the source image to the correct size.
+	if cache is not None:
+		cache.write(key,".png",resImg.save)
+	return resImg
+
+#
+#	Version of the way SVG masters are rasterised, part of the cache keys and the generator.
+#
+SVGVERSION = 2
+
+def svgMethod():
+	rasteriser = svgRasteriser()
+	return str(rasteriser) if rasteriser is None else rasteriser+":"+str(SVGVERSION)
+
+#
+#	Get the page size of an SVG file, from width and height if it has them, else the viewBox.
+#
+def svgSize(fileName):
+	root = xml.parse(fileName).getroot()
+	number = lambda s: float(re.match(r"^\s*([0-9.]+)",s).group(1))						# ignore any units
+	if root.get("width") is not None and root.get("height") is not None:
+		return number(root.get("width")),number(root.get("height"))
+	box = [float(x) for x in root.get("viewBox").replace(","," ").split()]
+	return box[2],box[3]
+
+#
+#	Rasterise the whole page of an SVG file at a size in pixels.
+#
+def svgRender(fileName,width,height):
+	if svgRasteriser() == "cairosvg":
+		data = cairosvg.svg2png(url = fileName,output_width = width,output_height = height)
+	else:
+		data = subprocess.check_output(["rsvg-convert","-w",str(width),"-h",str(height),fileName])
+	return Image.open(io.BytesIO(data)).convert("RGBA")
+
+#
+#	Rasterise an SVG master directly at the size required, fitted and centred in a transparent square so it is
+#	the same shape as a scaled PNG master. Cached on disk keyed on the hash of the SVG and the size.
+#
+#	Only the drawing is used, not the page it is on, as the PNG masters are exported from the drawing (the ones
+#	here are on an A4 Inkscape page). The page is drawn small to find where the drawing is, then at the scale
+#	which makes the drawing fill the square, and the drawing cut out of it.
+#
+def rasteriseImage(fileName,squareSz,cache = None,sourceHash = None):
+	if cache is not None:
+		key = cache.key("svg",svgMethod(),sourceHash,squareSz)
+		if cache.has(key,".png"):														# already done it in an earlier build.
+			return loadImage(cache.fileName(key,".png"))
+	pageSize = svgSize(fileName)
+	scale = 512 / max(pageSize)															# find the drawing.
+	probe = svgRender(fileName,max(1,int(round(pageSize[0]*scale))),max(1,int(round(pageSize[1]*scale))))
+	box = probe.getchannel("A").getbbox() or (0,0,probe.size[0],probe.size[1])
+	scale = scale * squareSz / max(box[2]-box[0],box[3]-box[1]) 						# draw it the right size.
+	page = svgRender(fileName,max(1,int(round(pageSize[0]*scale))),max(1,int(round(pageSize[1]*scale))))
+	drawing = page.crop(page.getchannel("A").getbbox() or (0,0,page.size[0],page.size[1]))
+	if max(drawing.size) != squareSz: 													# correct for the probe's rounding.
+		fit = squareSz / max(drawing.size)
+		drawing = drawing.resize((max(1,int(round(drawing.size[0]*fit))),max(1,int(round(drawing.size[1]*fit)))),resample = Image.BICUBIC)
+	resImg = Image.new("RGBA",(squareSz,squareSz),(0,0,0,0))							# centre it in a square
+	resImg.paste(drawing,box = (int((squareSz-drawing.size[0])/2),int((squareSz-drawing.size[1])/2)))
+	if cache is not None:
+		cache.write(key,".png",resImg.save)
+	return resImg
+
+#
+#	Render one icon or launch image from a scaled source image. This is the same for serial and parallel rendering
+#	so the output is byte-for-byte identical whichever is used.
+#
+def renderImage(resImg,targetFile,requiredSize,backgroundColour):
+	squareSz = min(requiredSize[0],requiredSize[1])										# this is the size we want the icon/launch to be square
+	image = Image.new("RGBA",requiredSize,backgroundColour)								# create an image of the required size
+																						# filled with background colour.
+	xOffset = int((requiredSize[0]-squareSz)/2) 										# work out offset in image
+	yOffset = int((requiredSize[1]-squareSz)/2)
+	image.paste(resImg,box = (xOffset,yOffset,xOffset+squareSz,yOffset+squareSz))		# Draw at appropriate position in image
+	image.save(targetFile)																# save it out.
+	del image 																			# free up memory space used by created image.
+
+#
+#	Key of a rendered icon or launch image in the disk cache ; it depends only on the source, how it is drawn, the
+#	size and the background, so an unchanged one is just copied from the cache without loading anything.
+#
+def renderKey(cache,sourceFile,sourceHash,requiredSize,backgroundColour):
+	method = svgMethod() if sourceFile.lower()[-4:] == ".svg" else "png"
+	return cache.key("rendered",method,sourceHash,requiredSize[0],requiredSize[1],tuple(backgroundColour))
+
+#
+#	Worker process version - images can't be passed between processes so it is given the source file name. It
+#	does all the targets which use one source, biggest first, so the source is only decoded once and each size
+#	is only scaled once ; nothing is decoded if they are all in the cache. Only the source and the image being
+#	rendered are held. Returns the time taken and size of each target, the decoding and scaling time being
+#	counted in the first which needs it.
+#
+def renderImageGroup(sourceFile,sourceHash,targets,backgroundColour,cacheDirectory):
+	start = time.time()
+	cache = ContentCache(cacheDirectory) if cacheDirectory is not None else None
+	decoded = []																		# the source, once loaded.
+	def source():
+		if len(decoded) == 0:
+			decoded.append(loadImage(sourceFile))
+		return decoded[0]
+	scaled = (None,None) 																# (size,image) last scaled.
+	timings = []
+	for targetFile,requiredSize in sorted(targets,key = lambda t: -min(t[1])):
+		squareSz = min(requiredSize[0],requiredSize[1])
+		key = renderKey(cache,sourceFile,sourceHash,requiredSize,backgroundColour) if cache is not None else None
+		if cache is None or not cache.fetch(key,".png",targetFile):
+			if scaled[0] != squareSz:
+				if sourceFile.lower()[-4:] == ".svg":
+					scaled = (squareSz,rasteriseImage(sourceFile,squareSz,cache,sourceHash))
+				else:
+					scaled = (squareSz,scaleImage(source,squareSz,cache,sourceHash))
+			renderImage(scaled[1],targetFile,requiredSize,backgroundColour)
+			if cache is not None:
+				cache.store(key,".png",targetFile)
+		timings.append((targetFile,time.time()-start,os.path.getsize(targetFile)))
+		start = time.time()
+	return timings
+
+#
+#	Decoded images, keyed on anything, limited to memoryLimit bytes. When it is full the least recently used
+#	images are dropped ; they are reloaded (or rescaled) if they are wanted again.
+#
+class ImageStore:
+	def __init__(self,memoryLimit):
+		self.memoryLimit = memoryLimit 														# most bytes to hold.
+		self.memoryUsed = 0
+		self.images = collections.OrderedDict() 											# key => image, oldest first.
+
+	def get(self,key,loader):
+		if key in self.images:																# have it, now most recently used.
+			self.images.move_to_end(key)
+			return self.images[key]
+		image = loader()																	# load it in.
+		self.images[key] = image
+		self.memoryUsed += self.imageBytes(image)
+		while self.memoryUsed > self.memoryLimit and len(self.images) > 1:					# drop old ones, keeping this one.
+			oldKey,oldImage = self.images.popitem(last = False)
+			self.memoryUsed -= self.imageBytes(oldImage)
+		return image
+
+	#
+	#	Drop all images whose key passes a test, e.g. because the source file has changed.
+	#
+	def discard(self,test):
+		for key in [k for k in self.images.keys() if test(k)]:
+			self.memoryUsed -= self.imageBytes(self.images.pop(key))
+
+	def imageBytes(self,image):
+		return image.size[0] * image.size[1] * len(image.getbands())
+
+#
+#	Class responsible for scaling/generation of launch images and application icons. If workers is more than one
+#	the images are rendered in that many processes. Each source is only scaled to each size once per run, and if
+#	a cache directory is given, scaled images and the finished icons and launch images are kept there for later
+#	builds.
+#
+#	Sources are chosen using the size in the PNG header ; they are only decoded when needed, and decoded and
+#	scaled images are held up to memoryLimit bytes. If there is an SVG master it is used in preference, being
+#	rasterised straight to each size required.
 #
 class DefaultFiles:
-	def __init__(self,sourceDirectory,orientation):
+	def __init__(self,sourceDirectory,orientation,workers = 1,cacheDirectory = None,memoryLimit = 256*1024*1024):
 		self.orientation = orientation.lower()												# save the orientation and check it
 		assert self.orientation == "portrait" or self.orientation == "landscape"
+		self.workers = max(1,workers or 1)													# number of rendering processes.
+		self.cacheDirectory = cacheDirectory 												# disk cache of scaled images
+		self.cache = ContentCache(cacheDirectory) if cacheDirectory is not None else None
+		self.memoryLimit = memoryLimit 														# most bytes of decoded images.
+		self.images = ImageStore(memoryLimit)												# decoded and scaled images.
+		self.sourceHashes = {} 																# file name => content hash
+		self.timings = [] 																	# (file,seconds,bytes) for each render.
 		self.reqInfo = RequiredFilesInformation(self.orientation) 							# instance of required files information.
-		self.sourceFiles = {} 																# file name => image.
-		for root,dirs,files in os.walk(sourceDirectory):									# examine the source files for launch/icon
+		self.sourceDirectory = sourceDirectory
+		self.optimiser = None 																# PngOptimiser for the results, if any.
+		self.pool = None 																	# shared worker pool, if any.
+		self.scan()
+
+	#
+	#	Find the source files.
+	#
+	def scan(self):
+		self.sourceSizes = {} 																# file name => size from header.
+		self.sourcePaths = {} 																# file name => full path.
+		self.vectorSources = [] 															# file names of SVG masters.
+		for root,dirs,files in os.walk(self.sourceDirectory):									# examine the source files for launch/icon
 			for f in files:
 				fl = f.lower()
 				if fl[:4] == "icon" or fl[:7] == "default" or fl[:6] == "launch":			# is it icon/default/launch.
 					if fl[-4:] == ".png":													# and it is a .png file 
-						assert f not in self.sourceFiles									# check for no duplicates.
-						self.sourceFiles[f] = Image.open(root+os.sep+f)						# read the image into memory.
+						assert f not in self.sourceSizes									# check for no duplicates.
+						self.sourceSizes[f] = pngSize(root+os.sep+f)						# just get its size for now.
+						self.sourcePaths[f] = root+os.sep+f
+					if fl[-4:] == ".svg":													# vector master.
+						assert f not in self.sourcePaths
+						self.vectorSources.append(f)
+						self.sourcePaths[f] = root+os.sep+f
+		if len(self.vectorSources) > 0 and svgRasteriser() is None:
+			print("        Warning : SVG masters ignored, install cairosvg or rsvg-convert to use them.")
+			self.vectorSources = []
+
+	#
+	#	Some source files have changed (watch mode), forget anything loaded from them and look for sources again.
+	#	Everything else that has been loaded or scaled is kept.
+	#
+	def refresh(self,changedFiles):
+		names = set([os.path.basename(f) for f in changedFiles])
+		self.images.discard(lambda key: key[1] in names)
+		for n in names:
+			self.sourceHashes.pop(n,None)
+		self.scan()
+		return self
 
 	#
 	#	Create all of type icon or default
 	#
-	def create(self,isIcon,targetDirectory,backgroundColour):
+	def create(self,isIcon,targetDirectory,backgroundColour,manifest = None):
 		fileList = self.reqInfo.query(isIcon,True,True)										# get all required files of that type.
-		for f in fileList:																	# Generate the files for them.
-			self.render(targetDirectory+os.sep+f["name"],f["size"],isIcon,backgroundColour)
+		sources = sorted(self.sourcePaths.values())+[self.reqInfo.fileName()]				# anything here might be used.
+		outputs = [targetDirectory+os.sep+f["name"] for f in fileList]
+		key = targetDirectory+os.sep+("<icons>" if isIcon else "<launch images>")
+		generator = "DefaultFiles:1:"+self.reqInfo.version()+":"+self.orientation+":"+str(tuple(backgroundColour))+":"+svgMethod()
+		generator = generator + (":optimised" if self.optimiser is not None else "")
+		if manifest is not None and manifest.isCurrent(key,sources,outputs,generator):
+			return self 																	# sources and results unchanged.
+		if self.workers > 1 and len(fileList) > 1:
+			self.renderParallel(fileList,targetDirectory,isIcon,backgroundColour)
+		else:
+			for f in fileList:																# Generate the files for them.
+				self.render(targetDirectory+os.sep+f["name"],f["size"],isIcon,backgroundColour)
+		if self.optimiser is not None:														# make them smaller before recording them.
+			self.optimiser.optimise(outputs)
+		if manifest is not None:
+			manifest.record(key,sources,outputs,generator)
+		return self
+
+	#
+	#	Create them across a pool of processes. Targets using the same source are grouped so it is only decoded
+	#	once, and the groups are done biggest first so the long launch images don't end up last. Groups are only
+	#	started while the images they will hold fit in memoryLimit along with those already running (one always
+	#	runs), so the memory used doesn't grow with the number of workers.
+	#
+	def renderParallel(self,fileList,targetDirectory,isIcon,backgroundColour):
+		groups = {} 																		# source => list of targets
+		for f in fileList:
+			groups.setdefault(self.nearest(f["size"],isIcon),[]).append((targetDirectory+os.sep+f["name"],f["size"]))
+		order = sorted(groups.keys(),key = lambda g: -sum([t[1][0]*t[1][1] for t in groups[g]]))
+		with processPool(self.pool,self.workers) as pool:
+			running = {} 																	# job => bytes it will use.
+			for g in order:
+				memory = self.groupMemory(g,groups[g])
+				while len(running) > 0 and sum(running.values())+memory > self.memoryLimit:	# wait for room.
+					done,pending = wait(list(running.keys()),return_when = FIRST_COMPLETED)
+					for job in done:
+						running.pop(job)
+						self.timings += job.result()
+				sourceHash = self.sourceHash(g) if self.cache is not None else None
+				running[pool.submit(renderImageGroup,self.sourcePaths[g],sourceHash,groups[g],backgroundColour,self.cacheDirectory)] = memory
+			for job in wait(list(running.keys()))[0]:										# wait for them, raising any errors.
+				self.timings += job.result()
+
+	#
+	#	Bytes a group will hold at once : the decoded source (an SVG is drawn on its page, a little bigger than the
+	#	biggest size), a scaled copy and the biggest image rendered, all RGBA.
+	#
+	def groupMemory(self,name,targets):
+		biggest = max([min(t[1][0],t[1][1]) for t in targets])
+		source = (2*biggest,2*biggest) if name in self.vectorSources else self.sourceSizes[name]
+		return 4*(source[0]*source[1] + biggest*biggest + max([t[1][0]*t[1][1] for t in targets]))
 
 	#
 	#	Create a single one. Look for the nearest size to the required size, fill with background and scale to size.
 	#
 	def render(self,targetFile,requiredSize,isIcon,backgroundColour):						# Generate a single file.
 		#print(targetFile,requiredSize,isIcon,backgroundColour)
+		start = time.time()
+		squareSz = min(requiredSize[0],requiredSize[1])
+		name = self.nearest(requiredSize,isIcon)
+		key = renderKey(self.cache,name,self.sourceHash(name),requiredSize,backgroundColour) if self.cache is not None else None
+		if self.cache is None or not self.cache.fetch(key,".png",targetFile): 			# not made before.
+			renderImage(self.getScaled(name,squareSz),targetFile,requiredSize,backgroundColour)
+			if self.cache is not None:
+				self.cache.store(key,".png",targetFile)
+		self.timings.append((targetFile,time.time()-start,os.path.getsize(targetFile)))
+
+	#
+	#	Get a source image scaled to a square, only resizing it the first time it is asked for.
+	#
+	def getScaled(self,name,squareSz):
+		sourceHash = self.sourceHash(name) if self.cache is not None else None
+		if name in self.vectorSources:
+			return self.images.get(("scaled",name,squareSz),lambda: rasteriseImage(self.sourcePaths[name],squareSz,self.cache,sourceHash))
+		source = lambda: self.images.get(("source",name),lambda: loadImage(self.sourcePaths[name]))
+		return self.images.get(("scaled",name,squareSz),lambda: scaleImage(source,squareSz,self.cache,sourceHash))
+
+	def sourceHash(self,name):
+		if name not in self.sourceHashes:
+			self.sourceHashes[name] = hashFile(self.sourcePaths[name])
+		return self.sourceHashes[name]
+
+	#
+	#	Find the source file with the nearest size to the square part of the required size.
+	#
+	def nearest(self,requiredSize,isIcon):
+		for k in self.vectorSources:														# vector masters are always the best.
+			if (k.lower()[0] == "i") == isIcon:
+				return k
 		squareSz = min(requiredSize[0],requiredSize[1])										# this is the size we want the icon/launch to be square
 		nearest = None 																		# best pick
 		nearestScore = 9999999 																# nearest score.
 
-		for k in self.sourceFiles.keys():													# work through the keys
+		for k in self.sourceSizes.keys():													# work through the keys
 			isKeyIcon = k.lower()[0] == "i"													# is this key an icon ?
 			if isKeyIcon == isIcon:															# is this the correct type (e.g. icon or default)
-				score = abs(self.sourceFiles[k].size[0]-squareSz)							# this is the "score" for this image.
+				score = abs(self.sourceSizes[k][0]-squareSz)								# this is the "score" for this image.
 				if score < nearestScore:												
 					nearestScore = score 
 					nearest = k
 		assert nearest is not None															# check we had at least one we could scale.
-
-		image = Image.new("RGBA",requiredSize,backgroundColour)								# create an image of the required size
-																							# filled with background colour.
-
-		resImg =self.sourceFiles[nearest].resize((squareSz,squareSz),resample=Image.BICUBIC)# resize the source image to the correct size.
-		xOffset = int((requiredSize[0]-squareSz)/2) 										# work out offset in image
-		yOffset = int((requiredSize[1]-squareSz)/2)
-		image.paste(resImg,box = (xOffset,yOffset,xOffset+squareSz,yOffset+squareSz))		# Draw at appropriate position in image
-		del resImg 																			# free up scaled image
-		image.save(targetFile)																# save it out.
-		del image 																			# free up memory space used by created image.
+		return nearest
 
 #  ****************************************************************************************************************
 # 		Date		Changes Made
 #		----		------------
 #		13 Jan 15 	First working version.
+#		18 Oct 26 	create() skips rendering if the build manifest says the icons/launch images are current.
+#		18 Oct 26 	Optional rendering across a process pool.
+#		18 Oct 26 	Scaled source images are reused within a run and can be cached on disk between runs.
+#		18 Oct 26 	Sources picked from PNG header sizes, decoded only when needed and held within a memory limit.
+#		18 Oct 26 	SVG masters are rasterised directly at each size if cairosvg or rsvg-convert is available.
+#		18 Oct 26 	Time and size of each file rendered kept in timings.
+#		18 Oct 26 	refresh() rescans sources after a change, keeping anything loaded from unchanged ones.
+#		18 Oct 26 	Results can be optimised by a PngOptimiser.
+#		18 Oct 26 	requiredfiles.json is a source, and its version part of the generator.
+#		18 Oct 26 	Rendering can use a shared worker pool.
+#		18 Oct 26 	Finished icons and launch images are cached too, keyed by source, size and background.
+#		18 Oct 26 	SVG masters are rasterised to the drawing, not the whole page.
+#		18 Oct 26 	Parallel rendering decodes each source once, with as many running as fit in memoryLimit.
 # 
 #  ****************************************************************************************************************
\ No newline at end of file
@@ -9,45 +9,155 @@
 #  ****************************************************************************************************************
 #  ****************************************************************************************************************
 
-import json,re
+import io,re,math
+
+#
+#	Escapes for Lua strings. Other control characters are written as \ddd, anything else is written as it is
+#	(so non ASCII characters go out as UTF-8, which Lua just treats as bytes)
+#
+def luaStringEscapes():
+	escapes = { ord('"'):'\\"', ord('\\'):'\\\\', ord('\n'):'\\n', ord('\r'):'\\r', ord('\t'):'\\t', ord('\b'):'\\b', ord('\f'):'\\f' }
+	for c in list(range(0,32))+[127]:
+		escapes.setdefault(c,"\\{0:03d}".format(c))
+	return escapes
 
 #
 #	Convert Python Data Structure to LUA format.
 #
+#	This writes the Lua table directly to a stream in one pass. The pretty printed layout is the same as the
+#	JSON based version it replaced (8 space indent, sorted keys, '= ' after keys) ; the compact layout has no
+#	spaces or new lines at all, for machine generated data files.
+#
+#	Keys which are Lua identifiers are written bare, keys which are already in ["..."] form (as used for plugin
+#	names and launch images in build.settings) are written as they are, and anything else is put in [].
+#
 class LuaFormatter:
-	def luaFormat(self,indent,name,contents):
-		# Note here the changing of the separator from the default ': ' to '= '
-		return name + " = \n"+self.fixJSON(json.dumps(contents,sort_keys = True,indent = 8,separators = (",","= ")))
+	VERSION = 1 																		# change if the output changes.
+	identifier = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")								# key which can be written bare
+	bracketed = re.compile(r'^\[".*"\]$',re.DOTALL)										# key which is already ["..."]
+	keywords = set("and break do else elseif end false for function goto if in local nil not or repeat return then true until while".split())
+	escapes = luaStringEscapes()
+	needsEscape = re.compile(r'[\x00-\x1f"\\\x7f]')									# characters which need escaping
+
+	def __init__(self,compact = False):
+		self.compact = compact 															# no whitespace if True
+		self.keyCache = {} 																# key => formatted key, as keys repeat a lot
 
-	def fixJSON(self,text):
-		lines = text.split("\n")													# Split around new line.
-		lines = [self.process(l.rstrip()) for l in lines]							# Process them
-		return "\n".join(lines)														# Rebuild
+	def luaFormat(self,indent,name,contents,compact = None):
+		stream = io.StringIO()
+		self.luaWrite(stream,indent,name,contents,compact)
+		return stream.getvalue()
 
-	def process(self,line):
-		spaceSize = len(line)-len(line.lstrip()) 									# Line chars which are spaces/tabs
-		return line[:spaceSize]+self.processText(line[spaceSize:])					# process the rest and add back on front.
+	#
+	#	Write name = contents to the stream, indent is the starting indent level. The name return makes it a
+	#	requireable module. Output is collected in pieces which are written out in large blocks.
+	#
+	def luaWrite(self,stream,indent,name,contents,compact = None):
+		compact = self.compact if compact is None else compact
+		self.stream = stream
+		self.pieces = []
+		if compact:
+			self.pieces.append(name+("" if name == "return" else "="))
+			self.writeValue(contents,None)
+		else:
+			self.pieces.append(name + ("\n" if name == "return" else " = \n")+" " * (indent * 8))
+			self.writeValue(contents,indent)
+		self.flush()
 
-	def processText(self,text):
-		rx = r'^\"(\w+)\"(=.*)$'													# match "(word)"=(something)
-		match = re.match(rx,text)													# this removes the quotes round												
-		if match is not None:														# keys.
-			text = match.group(1)+match.group(2)
+	def flush(self):
+		self.stream.write("".join(self.pieces))
+		self.pieces = []
 
-		rx = r'^\"\[\\\"(.*)\\\"\]\"(=.*)$'											# these fix the square bracketed
-		match = re.match(rx,text)													# keys which are in the launch 
-		if match is not None:														# images in build.settings.
-			text = '["'+match.group(1)+'"]'+match.group(2)							# remove escaping.
+	#
+	#	Write a value. level is the indent level, or None for compact output.
+	#
+	def writeValue(self,value,level):
+		out = self.pieces.append
+		if isinstance(value,dict):
+			if len(value) == 0:
+				out("{}")
+				return
+			try:
+				keys = sorted(value)
+			except TypeError: 															# mixed types of key
+				keys = sorted(value,key = str)
+			if level is None:
+				opening,separator,assign,closing = "{",",","=","}"
+			else:
+				spacing = "\n" + " " * ((level+1) * 8)
+				opening,separator,assign,closing = "{"+spacing,","+spacing,"= ","\n" + " " * (level * 8) + "}"
+				level = level + 1
+			keyCache = self.keyCache
+			out(opening)
+			first = True
+			for k in keys:
+				if not first:
+					out(separator)
+				first = False
+				key = keyCache.get(k)
+				if key is None:
+					key = keyCache[k] = self.formatKey(k)
+				out(key)
+				out(assign)
+				v = value[k]
+				if type(v) is str: 														# the usual case, done here.
+					out(self.formatString(v))
+				else:
+					self.writeValue(v,level)
+			out(closing)
+			if len(self.pieces) > 65536:												# write out in large blocks.
+				self.flush()
+		elif isinstance(value,(list,tuple)):
+			if len(value) == 0:
+				out("{}")
+				return
+			if level is None:
+				opening,separator,closing = "{",",","}"
+			else:
+				spacing = "\n" + " " * ((level+1) * 8)
+				opening,separator,closing = "{"+spacing,","+spacing,"\n" + " " * (level * 8) + "}"
+				level = level + 1
+			out(opening)
+			first = True
+			for v in value:
+				if not first:
+					out(separator)
+				first = False
+				self.writeValue(v,level)
+			out(closing)
+		else:
+			out(self.formatScalar(value))
 
-		if text[-1] == "[":															# Fix up square brackets.															
-			text = text[:-1] + "{"													# it is prettyprinted so []
-		if text[-1] == "]":															# are always on the end of lines
-			text = text[:-1] + "}"													# ] may be followed by a comma.
-		if len(text) >= 2 and text[-2:] == "],":															
-			text = text[:-2] + "},"
+	def formatKey(self,key):
+		if isinstance(key,str):
+			if LuaFormatter.identifier.match(key) is not None and key not in LuaFormatter.keywords:
+				return key
+			if LuaFormatter.bracketed.match(key) is not None:
+				return key
+			return "["+self.formatString(key)+"]"
+		return "["+self.formatScalar(key)+"]" 											# numeric keys
 
-		return text
+	def formatScalar(self,value):
+		if isinstance(value,str):
+			return self.formatString(value)
+		if value is None:
+			return "nil"
+		if value is True or value is False:
+			return "true" if value else "false"
+		if isinstance(value,float):
+			if math.isnan(value):
+				return "(0/0)"
+			if math.isinf(value):
+				return "math.huge" if value > 0 else "-math.huge"
+			return repr(value)
+		if isinstance(value,int):
+			return str(value)
+		return self.formatString(str(value))
 
+	def formatString(self,text):
+		if LuaFormatter.needsEscape.search(text) is None:								# most don't need escaping
+			return '"'+text+'"'
+		return '"'+text.translate(LuaFormatter.escapes)+'"'
 
 #  ****************************************************************************************************************
 # 		Date		Changes Made
@@ -55,5 +165,9 @@ class LuaFormatter:
 #		31 Dec 14 	First working version.
 #		26 Feb 15 	Rewritten completely, uses the Python JSON convertor and reformats the output to allow
 #					generation of lua compatible source (required for config.lua and build.settings at least)
+#		18 Oct 26 	Rewritten again, writes Lua directly to a stream in one pass rather than reprocessing JSON.
+#					Adds compact output, proper string escaping, nil/empty tables/non identifier keys.
+#		18 Oct 26 	VERSION of the output, for the build manifest.
 # 
 #  ****************************************************************************************************************
+
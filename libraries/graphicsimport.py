@@ -0,0 +1,235 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		graphicsimport.py
+# 		Purpose:	Packs the images in media/graphics into texture atlases with a Lua frame table.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+import os,re,time
+from libraries.scheduler import processPool
+from PIL import Image
+from libraries.formatter import LuaFormatter
+from libraries.binpacker import packRectangles
+from libraries.contentcache import ContentCache
+from libraries.manifest import hashFile
+
+#
+#	Density of a master image from its name, e.g. ship@4x.png is drawn at four times the base (@1x) size. Returns
+#	the name without the suffix and the density.
+#
+def masterDensity(frameName):
+	match = re.match(r"^(.*)@(\d+)x$",frameName)
+	if match is None:
+		return frameName,1
+	return match.group(1),int(match.group(2))
+
+#
+#	Suffixes for config.lua's imageSuffix, e.g. { "@2x":1.5, "@4x":3.0 }. Corona uses a variant once the content
+#	scale is three quarters of the way to it.
+#
+def imageSuffixes(densities):
+	return { "@"+str(d)+"x":d*0.75 for d in densities if d > 1 }
+
+#
+#	Get a master scaled to a size, from the disk cache if it has been done before.
+#
+def scaleMaster(image,sourceHash,size,cache):
+	if image.size == size:
+		return image
+	if cache is not None:
+		key = cache.key("variant",sourceHash,size[0],size[1])
+		if cache.has(key,".png"):
+			return Image.open(cache.fileName(key,".png")).convert("RGBA")
+	scaled = image.resize(size,resample = Image.BICUBIC)
+	if cache is not None:
+		cache.write(key,".png",scaled.save)
+	return scaled
+
+#
+#	Atlases go in their own directory in media, as text and sounds are all copied into media itself and an atlas
+#	could otherwise have the same name as one of them (media/graphics/levels and media/text/levels.xml)
+#
+ATLASDIRECTORY = "atlases"
+
+#
+#	Pack one atlas. Each image is trimmed to the part which isn't transparent, the trimmed images are packed into
+#	pages of no more than maxSize square, written as <name>.png (<name>_2.png etc.) and <name>.lua in the atlas
+#	directory, with the imageSheet options for each page and where each frame is, so in Corona :
+#
+#		local atlas = require("media.atlases.<name>")
+#		local sheet = graphics.newImageSheet("media/"..atlas.sheets[1].file,atlas.sheets[1].options)
+#		local frame = atlas.frames["player/walk1"] 						-- { sheet = 1, frame = n }
+#
+#	Each page is also written at every density in densities (e.g. <name>@2x.png) ; the layout is the same, at
+#	that scale, so the frame table (which is always @1x) works for all of them. Variants are made by scaling
+#	the master up or down and are cached by the hash of the master.
+#
+#	Returns the list of files written and (file,seconds,bytes) for each. Run in worker processes.
+#
+def packAtlas(name,files,targetDirectory,maxSize,padding,densities = (1,),cacheDirectory = None):
+	start = time.time()
+	cache = ContentCache(cacheDirectory) if cacheDirectory is not None else None
+	chosen = {} 																		# frame => (density,file)
+	for frameName,fileName in files:													# use the biggest master of each.
+		frameName,density = masterDensity(frameName)
+		if frameName not in chosen or chosen[frameName][0] < density:
+			chosen[frameName] = (density,fileName)
+	masters = {}
+	sizes = {}
+	trim = {}
+	for frameName,(density,fileName) in chosen.items():
+		image = Image.open(fileName).convert("RGBA")
+		masters[frameName] = (image,density,hashFile(fileName) if cache is not None else None)
+		baseSize = (max(1,int(round(image.size[0]/density))),max(1,int(round(image.size[1]/density))))
+		box = image.getchannel("A").getbbox() or (0,0,1,1) 							# all transparent, keep a pixel.
+		box = (box[0] // density,box[1] // density,-(-box[2] // density),-(-box[3] // density))
+		box = (box[0],box[1],min(box[2],baseSize[0]),min(box[3],baseSize[1])) 		# trimmed area at @1x
+		trim[frameName] = (box,baseSize)
+		sizes[frameName] = (box[2]-box[0],box[3]-box[1])
+	pages = packRectangles(sizes,maxSize // max(densities),padding,True)			# biggest variant fits maxSize
+	sheets = []
+	frames = {}
+	written = []
+	for n,page in enumerate(pages):
+		frameList = []
+		for frameName in sorted(page["placed"].keys()):
+			x,y,w,h = page["placed"][frameName]
+			box,baseSize = trim[frameName]
+			frameList.append({ "x":x, "y":y, "width":w, "height":h,
+							   "sourceX":box[0], "sourceY":box[1], "sourceWidth":baseSize[0], "sourceHeight":baseSize[1] })
+			frames[frameName] = { "sheet":n+1, "frame":len(frameList) }
+		fileName = name+("" if n == 0 else "_"+str(n+1))
+		for d in densities:
+			atlas = Image.new("RGBA",(page["size"][0]*d,page["size"][1]*d),(0,0,0,0))
+			for frameName,(x,y,w,h) in page["placed"].items():
+				image,density,sourceHash = masters[frameName]
+				box,baseSize = trim[frameName]
+				variant = scaleMaster(image,sourceHash,(baseSize[0]*d,baseSize[1]*d),cache)
+				atlas.paste(variant.crop((box[0]*d,box[1]*d,box[2]*d,box[3]*d)),(x*d,y*d))
+			suffix = "" if d == 1 else "@"+str(d)+"x"
+			atlas.save(targetDirectory+os.sep+fileName+suffix+".png")
+			written.append(targetDirectory+os.sep+fileName+suffix+".png")
+		sheets.append({ "file":ATLASDIRECTORY+"/"+fileName+".png", "options":{ "frames":frameList, "sheetContentWidth":page["size"][0], "sheetContentHeight":page["size"][1] } })
+	with open(targetDirectory+os.sep+name+".lua","w",encoding = "utf-8") as stream:
+		LuaFormatter().luaWrite(stream,0,"return",{ "sheets":sheets, "frames":frames })
+	written.append(targetDirectory+os.sep+name+".lua")
+	timings = [(f,0.0,os.path.getsize(f)) for f in written]
+	timings[0] = (timings[0][0],time.time()-start,timings[0][2]) 						# all the time goes in the first
+	return written,timings
+
+#
+#	Imports graphics. Each subdirectory of the source directory is one atlas named after it (images in the source
+#	directory itself go in "graphics"), frames being named by their path in the subdirectory, e.g. "walk/left1".
+#	Atlases are only repacked if one of their images has changed, and are packed in a process pool.
+#
+#	Masters can be drawn at any density, marked by their name (ship@2x.png) ; each atlas is made at every one of
+#	densities up to that of the highest density master, with maxSize being the limit for the biggest. Nothing is
+#	made at a density there are no masters for, so without @4x masters there is no @4x, and without any masters
+#	at all nothing but @1x. made is the densities actually made, for config.lua's imageSuffix.
+#
+class GraphicsImporter:
+	def __init__(self,sourceDirectory,workers = 1,maxSize = 2048,padding = 2,densities = (1,),cacheDirectory = None,pool = None):
+		self.pool = pool 																	# shared worker pool, if any.
+		self.sourceDirectory = sourceDirectory
+		self.densities = tuple(sorted(set([1]+list(densities)))) 						# always have @1x
+		self.made = (1,) 																	# densities made, from the masters
+		self.cacheDirectory = cacheDirectory 												# cache of scaled variants
+		self.workers = max(1,workers or 1)
+		self.maxSize = maxSize 																# biggest atlas page
+		self.padding = padding 																# space between images
+		self.timings = [] 																	# (file,seconds,bytes)
+		self.atlasCount = 0 																# atlases packed
+		self.skipped = 0 																	# atlases unchanged
+
+	#
+	#	Get atlas name => list of (frame name,file name)
+	#
+	def scan(self):
+		atlases = {}
+		if not os.path.isdir(self.sourceDirectory):
+			return atlases
+		for root,dirs,files in os.walk(self.sourceDirectory):
+			dirs.sort()
+			relative = os.path.relpath(root,self.sourceDirectory).split(os.sep)
+			atlas = "graphics" if relative[0] == "." else relative[0].lower()
+			for f in sorted(files):
+				if f.lower().endswith(".png"):
+					frameName = "/".join(relative[1:] + [f[:-4]]).lower()
+					atlases.setdefault(atlas,[]).append((frameName,root+os.sep+f))
+		return atlases
+
+	def generator(self):
+		return "GraphicsImporter:1:{0}:{1}:{2}:{3}".format(LuaFormatter.VERSION,self.maxSize,self.padding,self.made)
+
+	#
+	#	The densities wanted which there is a master for, or a higher one. Lower density masters in the same atlas
+	#	are scaled up, as there is nothing better to use.
+	#
+	def densitiesMade(self,atlases):
+		highest = max([masterDensity(f[0])[1] for files in atlases.values() for f in files] + [1])
+		return tuple([d for d in self.densities if d <= highest])
+
+	#
+	#	Atlases are written to the atlas directory in targetDirectory (source/media)
+	#
+	def importAll(self,targetDirectory,manifest = None):
+		atlases = self.scan()
+		self.made = self.densitiesMade(atlases)
+		if manifest is not None:
+			self.removeOld(targetDirectory,manifest)
+		targetDirectory = targetDirectory+os.sep+ATLASDIRECTORY
+		if not os.path.isdir(targetDirectory):
+			os.makedirs(targetDirectory,exist_ok = True)
+		jobs = []
+		for name in sorted(atlases.keys()):
+			key = targetDirectory+os.sep+name+".lua"
+			sources = [f[1] for f in atlases[name]]
+			if manifest is not None and manifest.isCurrent(key,sources,manifest.outputs(key),self.generator()):
+				self.skipped += 1
+			else:
+				jobs.append((name,atlases[name],key,sources))
+		if self.workers > 1 and len(jobs) > 1:
+			with processPool(self.pool,self.workers) as pool:
+				results = [pool.submit(packAtlas,j[0],j[1],targetDirectory,self.maxSize,self.padding,self.made,self.cacheDirectory) for j in jobs]
+				results = [r.result() for r in results]
+		else:
+			results = [packAtlas(j[0],j[1],targetDirectory,self.maxSize,self.padding,self.made,self.cacheDirectory) for j in jobs]
+		for job,(written,timings) in zip(jobs,results):
+			self.timings += timings
+			self.atlasCount += 1
+			if manifest is not None:
+				for old in manifest.outputs(job[2]): 										# remove pages no longer used
+					if old not in written and os.path.isfile(old):
+						os.remove(old)
+				manifest.record(job[2],job[3],written,self.generator())
+		return self
+
+	#
+	#	Atlases used to be written to targetDirectory itself ; remove the pages of any built there. The .lua is left
+	#	as a text file may have been written over it.
+	#
+	def removeOld(self,targetDirectory,manifest):
+		for key,entry in manifest.items():
+			if os.path.dirname(key) == targetDirectory and entry["generator"].startswith("GraphicsImporter:"):
+				for old in manifest.outputs(key):
+					if old.endswith(".png") and os.path.isfile(old):
+						os.remove(old)
+				manifest.forget(key)
+
+	def report(self):
+		return "{0} atlases packed, {1} unchanged".format(self.atlasCount,self.skipped)
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	Masters can be at any density (@2x etc.), atlases made at each density wanted.
+#		18 Oct 26 	Packing can use a shared worker pool.
+#		18 Oct 26 	Atlases written to media/atlases, so they can't have the same name as a text file.
+#		18 Oct 26 	Generator includes the LuaFormatter VERSION.
+# 
+#  ****************************************************************************************************************
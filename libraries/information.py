@@ -23,9 +23,10 @@ class InformationLoader:
 	def __init__(self):
 		self.formatter = LuaFormatter() 													# working formatter
 
-	def loadInfo(self):
+	def loadInfo(self,fileName = "information.xml"):
+		self.fileName = fileName 															# where it came from.
 		initial = { "application":{}, "configuration":{}, "identity":{}}					# information structure
-		self.information = self.load("information.xml",initial)								# load it in.
+		self.information = self.load(fileName,initial)								# load it in.
 		self.usesAdverts = self.getBoolean("configuration","adverts")						# adverts used ?
 		self.usesBanners = self.getBoolean("configuration","usesBanners") 					# do we use banners and interstitials ?
 		self.usesInterstitials = self.getBoolean("configuration","usesInterstitials")
@@ -53,18 +54,68 @@ class InformationLoader:
 				initial[section.tag.lower()][key.tag.lower()] = key.text					# copying the children in.
 		return initial
 
-	def generate(self,directory):
+	#
+	#	Convert an XML file to a Lua module without loading all of it, for very large data files. The sections
+	#	are written as they are read and then freed, so memory use does not depend on the size of the file. As
+	#	a section may appear more than once, each one is merged into the table as load() does.
+	#
+	#	Lua 5.1 allows a function 262143 constants, so each section, and each BLOCK entries of a big one, is
+	#	a function of its own : section("name",function() return { ... } end)
+	#
+	BLOCK = 10000
+	STREAMVERSION = 2 																	# change if stream() output changes.
+
+	def stream(self,fileName,stream,initial):
+		fmt = self.formatter
+		fmt.luaWrite(stream,0,"local data",initial)
+		stream.write("\n\nlocal function section(name,entries)\n\tlocal s = data[name] or {}\n\tdata[name] = s\n")
+		stream.write("\tfor k,v in pairs(entries()) do s[k] = v end\nend\n\n")
+		depth = 0
+		for event,element in xml.iterparse(fileName,events = ("start","end")):
+			if event == "start":
+				depth = depth + 1
+				if depth == 1:																# the root, freed at end of each section
+					root = element
+				if depth == 2:																# start of a section
+					name = fmt.formatString(element.tag.lower())
+					stream.write("section("+name+",function() return {")
+					separator = "\n        "
+					count = 0
+			else:
+				if depth == 3:																# a key, write it and free it
+					if count == InformationLoader.BLOCK: 									# start another function.
+						stream.write("\n} end)\nsection("+name+",function() return {")
+						separator = "\n        "
+						count = 0
+					stream.write(separator+fmt.formatKey(element.tag.lower())+"= "+fmt.formatScalar(element.text))
+					separator = ",\n        "
+					count = count + 1
+					element.clear()
+				if depth == 2:																# end of section.
+					stream.write("\n} end)\n")
+					root.clear()
+				depth = depth - 1
+		stream.write("\nreturn data\n")
+
+	def generate(self,directory,manifest = None):
+		tgtFile = directory+os.sep+"information.lua"
+		generator = "InformationLoader:1:"+str(LuaFormatter.VERSION)
+		if manifest is not None and manifest.isCurrent(tgtFile,[self.fileName],[tgtFile],generator):
+			return self 																# nothing changed, keep the old one.
 		self.infoCopy = {}																	# Copy the information dictionary.
 		for k in self.information.keys():
 			self.infoCopy[k] = self.information[k]
 		for a in self.getAdvertList().split(","):											# delete raw advert data (e.g. admob/vungle bits)
 			if a in self.infoCopy: 															# use the adverts structure which is built to 
 				del self.infoCopy[a]	 													# suit.
-		return self.write(directory+os.sep+"information.lua","ApplicationInformation",self.infoCopy)
+		self.write(tgtFile,"ApplicationInformation",self.infoCopy)
+		if manifest is not None:														# remember how it was built.
+			manifest.record(tgtFile,[self.fileName],[tgtFile],generator)
+		return self
 
 	def write(self,tgtFile,globalName,data):
-		infoLua = self.formatter.luaFormat(0,globalName,data)								# convert to LUA
-		open(tgtFile,"w").write(infoLua)													# and write it out.
+		with open(tgtFile,"w",encoding = "utf-8") as stream:								# convert to LUA and write it out.
+			self.formatter.luaWrite(stream,0,globalName,data)
 		return self
 
 	def getAdvertList(self):																# possible monetisation via adverts.
@@ -107,5 +158,10 @@ class InformationLoader:
 #		----		------------
 #		11 Jan 14 	First working version.
 #		26 Feb 15 	Converted to parse XML rather than text files.
+#		18 Oct 26 	generate() skips writing information.lua if the build manifest says it is current.
+#		18 Oct 26 	write() streams the Lua straight to the file.
+#		18 Oct 26 	stream() converts large XML files incrementally.
+#		18 Oct 26 	Streamed sections are written as functions, BLOCK entries at most, so Lua's constant limit isn't reached.
+#		18 Oct 26 	Build manifest generator includes the LuaFormatter VERSION.
 # 
 #  ****************************************************************************************************************
\ No newline at end of file
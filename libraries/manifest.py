@@ -0,0 +1,152 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		manifest.py
+# 		Purpose:	Build manifest - records inputs/outputs of each build stage so unchanged work is skipped.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+import os,json,hashlib,threading
+
+#
+#	Return the content hash of a file, read in blocks so large sound files do not need to be in memory.
+#
+def hashFile(fileName):
+	digest = hashlib.sha1()																# SHA1 is plenty for change detection
+	with open(fileName,"rb") as f:
+		block = f.read(1024*1024)
+		while len(block) > 0:
+			digest.update(block)
+			block = f.read(1024*1024)
+	return digest.hexdigest()
+
+#
+#	The manifest is a JSON file mapping a stage key (e.g. "information.lua" or a copied file) to the settings
+#	(generator version and parameters) used, and the path, size, modification time and hash of every source
+#	and output. A stage is current if the settings match, all outputs are still there as written and no source
+#	has changed content. Size + mtime are checked first so a no-op build does not have to hash anything.
+#
+#	Stages running at the same time share one manifest, so changes to it are made holding a lock. Files are hashed
+#	without holding it, so one stage hashing large files doesn't hold up the others.
+#
+class BuildManifest:
+	VERSION = 1 																		# format version of manifest file.
+
+	def __init__(self,fileName):
+		self.fileName = fileName 														# where the manifest lives.
+		self.entries = {} 																# key => entry
+		self.hashCache = {} 															# path => record, hashed this run.
+		self.lock = threading.Lock() 													# held while changing any of it.
+		if os.path.isfile(fileName):													# load any previous manifest.
+			try:
+				data = json.load(open(fileName,"r"))
+				if data.get("version") == BuildManifest.VERSION:						# ignore if format has changed.
+					self.entries = data["entries"]
+			except ValueError:															# corrupt, just rebuild everything
+				print('        Warning : build manifest "'+fileName+'" is corrupt, ignored.')
+
+	#
+	#	Get the record for a file, using the previous record to avoid hashing if the size and mtime are unchanged.
+	#
+	def fileRecord(self,fileName,previous = None):
+		stat = os.stat(fileName)
+		record = self.hashCache.get(fileName)
+		if record is not None:															# already done this run.
+			if record["size"] == stat.st_size and record["mtime"] == stat.st_mtime:
+				return record
+		if previous is not None and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+			fileHash = previous["hash"] 												# unchanged, trust the old hash.
+		else:
+			fileHash = hashFile(fileName)												# otherwise hash it.
+		record = { "path":fileName, "size":stat.st_size, "mtime":stat.st_mtime, "hash":fileHash }
+		with self.lock:
+			self.hashCache[fileName] = record
+		return record
+
+	#
+	#	Check if the stage identified by key is up to date.
+	#
+	def isCurrent(self,key,sources,outputs,generator):
+		entry = self.entries.get(key)
+		if entry is None or entry["generator"] != generator:							# never built, or built differently
+			return False
+		if [x["path"] for x in entry["sources"]] != list(sources): 						# different set of sources
+			return False
+		if [x["path"] for x in entry["outputs"]] != list(outputs):						# different set of outputs
+			return False
+		for old in entry["outputs"]:													# outputs must be as we left them
+			if not os.path.isfile(old["path"]):
+				return False
+			stat = os.stat(old["path"])
+			if stat.st_size != old["size"] or stat.st_mtime != old["mtime"]:
+				return False
+		for old in entry["sources"]:													# sources must have the same content
+			if not os.path.isfile(old["path"]):
+				return False
+			record = self.fileRecord(old["path"],old)
+			if record["hash"] != old["hash"]:
+				return False
+			with self.lock:
+				old["mtime"] = record["mtime"]											# touched but same, don't hash again.
+		return True
+
+	#
+	#	Record that the stage identified by key has been built from the given sources to the given outputs.
+	#
+	def record(self,key,sources,outputs,generator):
+		previous = self.entries.get(key,{ "sources":[] })								# reuse hashes where possible
+		previous = { x["path"]:x for x in previous["sources"] }
+		entry = { "generator":generator,
+				  "sources":[self.fileRecord(s,previous.get(s)) for s in sources],
+				  "outputs":[self.outputRecord(o) for o in outputs] }
+		with self.lock:
+			self.entries[key] = entry
+
+	#
+	#	Remove the entry for a key which is no longer built.
+	#
+	def forget(self,key):
+		with self.lock:
+			self.entries.pop(key,None)
+
+	#
+	#	(key,entry) for every entry, as it is now.
+	#
+	def items(self):
+		with self.lock:
+			return list(self.entries.items())
+
+	#
+	#	Outputs recorded last time for a key, for stages which don't know what they will create until they do it.
+	#
+	def outputs(self,key):
+		return [x["path"] for x in self.entries.get(key,{ "outputs":[] })["outputs"]]
+
+	def outputRecord(self,fileName):
+		stat = os.stat(fileName)
+		return { "path":fileName, "size":stat.st_size, "mtime":stat.st_mtime }
+
+	#
+	#	Write the manifest back out.
+	#
+	def save(self):
+		directory = os.path.dirname(self.fileName)
+		if directory != "" and not os.path.isdir(directory):							# create temp directory if needed.
+			os.makedirs(directory)
+		with self.lock: 																# as it is now, not half changed.
+			text = json.dumps({ "version":BuildManifest.VERSION, "entries":self.entries },sort_keys = True,indent = 1)
+		with open(self.fileName,"w") as f:
+			f.write(text)
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	outputs() gives the outputs recorded for a key.
+#		18 Oct 26 	Changes made holding a lock, as stages running at once share the manifest.
+#		18 Oct 26 	forget() removes an entry.
+# 
+#  ****************************************************************************************************************
@@ -0,0 +1,195 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		packager.py
+# 		Purpose:	Incremental zip file writer, used to build system.zip
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+import os,time,zlib,struct,fnmatch,zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+#
+#	Files which are already compressed, which are stored rather than deflated.
+#
+STORED_TYPES = set(["mp3","png","jpg","jpeg","ogg","m4a","zip","gz"])
+
+#
+#	Convert a file modification time to the zip (MS-DOS) date and time, which is local time to 2 seconds.
+#
+def dosDateTime(mtime):
+	t = time.localtime(mtime)
+	year = max(1980,t.tm_year)
+	return ((year-1980) << 9) | (t.tm_mon << 5) | t.tm_mday,(t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+
+#
+#	Compress one member, returns (method,crc,compressed data,uncompressed size). Run in threads, zlib releases
+#	the GIL so several files are compressed at once.
+#
+def compressMember(fileName,store,level):
+	data = open(fileName,"rb").read()
+	crc = zlib.crc32(data) & 0xFFFFFFFF
+	if not store:
+		compressor = zlib.compressobj(level,zlib.DEFLATED,-15) 								# raw deflate, as zip wants
+		packed = compressor.compress(data) + compressor.flush()
+		if len(packed) < len(data):															# only if it is actually smaller
+			return (zipfile.ZIP_DEFLATED,crc,packed,len(data))
+	return (zipfile.ZIP_STORED,crc,data,len(data))
+
+#
+#	Builds a zip file from a list of members. Members whose file has the same size and time as in the previous zip
+#	(and would be stored the same way) have their compressed data copied as it is, everything else is compressed
+#	in parallel. The new zip is written to a temporary file and renamed, so a failed build leaves the old one.
+#
+class ZipPackager:
+	def __init__(self,zipFile,workers = 1,level = 9):
+		self.zipFile = zipFile 																# zip file being built
+		self.workers = workers 																# compressing threads
+		self.level = level 																	# deflate level
+		self.members = [] 																	# (name in zip,file or directory)
+		self.reused = 0
+		self.compressed = 0
+
+	#
+	#	Add a file or directory entry. Names in the zip always use /
+	#
+	def addFile(self,fileName):
+		self.members.append((fileName.replace(os.sep,"/"),fileName))
+
+	def addDirectory(self,directory):
+		self.members.append((directory.replace(os.sep,"/").rstrip("/")+"/",directory))
+
+	#
+	#	Add a directory and everything in it (like zip -r)
+	#
+	def addTree(self,directory):
+		if os.path.isfile(directory):
+			self.addFile(directory)
+			return
+		for root,dirs,files in os.walk(directory):
+			dirs.sort()
+			self.addDirectory(root)
+			for f in sorted(files):
+				self.addFile(os.path.join(root,f))
+
+	#
+	#	Remove members whose zip name matches a wildcard, where * matches / as well as in zip -d
+	#
+	def remove(self,*patterns):
+		self.members = [m for m in self.members if not any([fnmatch.fnmatchcase(m[0],p) for p in patterns])]
+
+	#
+	#	Should this member be stored, not compressed ?
+	#
+	def isStored(self,name):
+		return name.endswith("/") or name.split(".")[-1].lower() in STORED_TYPES
+
+	#
+	#	Write the zip file.
+	#
+	def write(self):
+		seen = set()
+		members = []
+		for name,fileName in self.members:													# remove duplicates, keeping order
+			if name not in seen:
+				seen.add(name)
+				members.append((name,fileName,os.stat(fileName)))
+		assert len(members) < 0xFFFF,"Too many files for a zip file"
+		previous = None
+		if os.path.isfile(self.zipFile):
+			try:
+				previous = zipfile.ZipFile(self.zipFile)
+			except zipfile.BadZipFile:														# broken, just build a new one.
+				previous = None
+		oldEntries = {} if previous is None else { i.filename:i for i in previous.infolist() }
+		#
+		#	Work out what can be reused and compress the rest.
+		#
+		jobs = {}
+		reuse = {}
+		for name,fileName,stat in members:
+			if name.endswith("/"):
+				continue
+			store = self.isStored(name)
+			old = oldEntries.get(name)
+			if old is not None and old.file_size == stat.st_size and old.flag_bits & 1 == 0 and \
+						self.dosDateTimeOf(old) == dosDateTime(stat.st_mtime) and \
+						(old.compress_type == zipfile.ZIP_STORED or not store):
+				reuse[name] = old
+			else:
+				jobs[name] = (fileName,store)
+		results = {}
+		if self.workers > 1 and len(jobs) > 1:
+			with ThreadPoolExecutor(max_workers = self.workers) as pool:
+				order = sorted(jobs.keys(),key = lambda n: -os.path.getsize(jobs[n][0]))	# biggest first
+				futures = { n:pool.submit(compressMember,jobs[n][0],jobs[n][1],self.level) for n in order }
+				results = { n:f.result() for n,f in futures.items() }
+		else:
+			results = { n:compressMember(jobs[n][0],jobs[n][1],self.level) for n in jobs.keys() }
+		#
+		#	Write the new zip file.
+		#
+		tempName = self.zipFile+".tmp"
+		central = []
+		with open(tempName,"wb") as target:
+			for name,fileName,stat in members:
+				date,clock = dosDateTime(stat.st_mtime)
+				if name.endswith("/"):
+					method,crc,data,size = zipfile.ZIP_STORED,0,b"",0
+				elif name in reuse:
+					old = reuse[name]
+					method,crc,data,size = old.compress_type,old.CRC,self.rawData(previous,old),old.file_size
+				else:
+					method,crc,data,size = results[name]
+				encoded = name.encode("utf-8")
+				flags = 0 if name.isascii() else 0x800 										# bit 11 : name is UTF-8
+				offset = target.tell()
+				assert offset < 0xFFFFFFFF and len(data) < 0xFFFFFFFF,"Zip file too large"
+				target.write(struct.pack("<IHHHHHIIIHH",0x04034B50,20,flags,method,clock,date,crc,len(data),size,len(encoded),0))
+				target.write(encoded)
+				target.write(data)
+				attributes = (stat.st_mode & 0xFFFF) << 16 | (0x10 if name.endswith("/") else 0)
+				central.append(struct.pack("<IHHHHHHIIIHHHHHII",0x02014B50,(3 << 8) | 20,20,flags,method,clock,date,crc,
+										   len(data),size,len(encoded),0,0,0,0,attributes,offset) + encoded)
+			start = target.tell()
+			for c in central:
+				target.write(c)
+			target.write(struct.pack("<IHHHHIIH",0x06054B50,0,0,len(central),len(central),target.tell()-start,start,0))
+		if previous is not None:
+			previous.close()
+		os.replace(tempName,self.zipFile)
+		self.reused = len(reuse)
+		self.compressed = len(jobs)
+		return self
+
+	#
+	#	Date and time of an existing entry in the same form as dosDateTime()
+	#
+	def dosDateTimeOf(self,info):
+		t = info.date_time
+		return ((t[0]-1980) << 9) | (t[1] << 5) | t[2],(t[3] << 11) | (t[4] << 5) | (t[5] // 2)
+
+	#
+	#	Read the compressed data of an entry in an existing zip file without decompressing it.
+	#
+	def rawData(self,archive,info):
+		stream = archive.fp
+		stream.seek(info.header_offset)
+		header = stream.read(30)
+		assert header[:4] == b"PK\x03\x04","Bad zip entry "+info.filename
+		nameLength,extraLength = struct.unpack("<HH",header[26:30])
+		stream.seek(info.header_offset+30+nameLength+extraLength)
+		return stream.read(info.compress_size)
+
+	def report(self):
+		return "{0} files, {1} unchanged, {2} compressed.".format(len(self.members),self.reused,self.compressed)
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+# 
+#  ****************************************************************************************************************
@@ -0,0 +1,121 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		pngoptimiser.py
+# 		Purpose:	Makes generated PNG files (icons, launch images) as small as possible without losing anything.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+import os,io,time,zlib
+from libraries.scheduler import processPool
+from PIL import Image,ImageChops
+from libraries.contentcache import ContentCache
+from libraries.manifest import hashFile
+
+VERSION = 1 																			# change if the method changes.
+
+#
+#	Ways of storing the same image. An RGBA image which is all opaque can be RGB, and anything with 256 colours or
+#	less can be a palette image ; these are only used if converting back gives exactly the same pixels.
+#
+def losslessVersions(image):
+	if image.mode not in ["RGB","RGBA"]:
+		image = image.convert("RGBA")
+	versions = [image]
+	if image.mode == "RGBA" and image.getchannel("A").getextrema() == (255,255):		# alpha not used.
+		image = image.convert("RGB")
+		versions.append(image)
+	colours = image.getcolors(256)
+	if colours is not None: 															# few enough for a palette.
+		method = Image.Quantize.FASTOCTREE if image.mode == "RGBA" else Image.Quantize.MEDIANCUT
+		palette = image.quantize(colors = len(colours),method = method,dither = Image.Dither.NONE)
+		if isSame(palette.convert(image.mode),image):
+			versions.append(palette)
+	return versions
+
+def isSame(image1,image2):
+	return image1.size == image2.size and ImageChops.difference(image1,image2).getbbox() is None
+
+#
+#	Encode an image in every way (maximum compression, each zlib strategy) and return the smallest PNG data.
+#	Nothing but the image (and transparency) is written, so any metadata is dropped.
+#
+def smallestPng(image):
+	best = None
+	for version in losslessVersions(image):
+		for strategy in [zlib.Z_DEFAULT_STRATEGY,zlib.Z_FILTERED,zlib.Z_RLE]:
+			data = io.BytesIO()
+			options = { "compress_level":9, "compress_type":strategy }
+			if "transparency" in version.info:
+				options["transparency"] = version.info["transparency"]
+			version.save(data,"PNG",**options)
+			if best is None or len(data.getvalue()) < len(best):
+				best = data.getvalue()
+	return best
+
+#
+#	Optimise one file in place, returns (file,bytes before,bytes after,seconds). The result is cached on the hash
+#	of the file (and of the result, so optimising it again is free) so the same image is only optimised once.
+#	Used in worker processes.
+#
+def optimiseFile(fileName,cacheDirectory):
+	start = time.time()
+	before = os.path.getsize(fileName)
+	cache = ContentCache(cacheDirectory) if cacheDirectory is not None else None
+	if cache is not None:
+		key = cache.key("optimised",VERSION,hashFile(fileName))
+		if cache.fetch(key,".png",fileName):											# done this one before.
+			return (fileName,before,os.path.getsize(fileName),time.time()-start)
+	image = Image.open(fileName)
+	image.load()
+	data = smallestPng(image)
+	if len(data) < before: 																# only if it is better.
+		with open(fileName+".tmp","wb") as f:
+			f.write(data)
+		os.replace(fileName+".tmp",fileName)
+	if cache is not None:
+		cache.store(key,".png",fileName)
+		cache.store(cache.key("optimised",VERSION,hashFile(fileName)),".png",fileName)
+	return (fileName,before,os.path.getsize(fileName),time.time()-start)
+
+#
+#	Optimises a list of PNG files, in a process pool if there is more than one worker.
+#
+class PngOptimiser:
+	def __init__(self,workers = 1,cacheDirectory = None,pool = None):
+		self.pool = pool 																# shared worker pool, if any.
+		self.workers = max(1,workers or 1)
+		self.cacheDirectory = cacheDirectory 											# cache of optimised files.
+		self.results = [] 																# (file,before,after,seconds)
+
+	def optimise(self,fileNames):
+		if self.workers > 1 and len(fileNames) > 1:
+			order = sorted(fileNames,key = lambda f: -os.path.getsize(f)) 				# biggest first.
+			with processPool(self.pool,self.workers) as pool:
+				self.results += list(pool.map(optimiseFile,order,[self.cacheDirectory]*len(order)))
+		else:
+			self.results += [optimiseFile(f,self.cacheDirectory) for f in fileNames]
+		return self
+
+	#
+	#	Size before and after for each file, and the total.
+	#
+	def report(self):
+		lines = []
+		for f,before,after,seconds in sorted(self.results):
+			lines.append("{0:40} {1:9} => {2:9} bytes ({3:3.0f}%)".format(os.path.basename(f),before,after,100.0*after/max(1,before)))
+		before = sum([r[1] for r in self.results])
+		after = sum([r[2] for r in self.results])
+		lines.append("{0:40} {1:9} => {2:9} bytes ({3:3.0f}%)".format("Total",before,after,100.0*after/max(1,before)))
+		return lines
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	Can use a shared worker pool.
+# 
+#  ****************************************************************************************************************
@@ -9,78 +9,141 @@
 #  ****************************************************************************************************************
 #  ****************************************************************************************************************
 
+import os,json
+
+#
+#	One required file. These are shared by everything that asks, so they can't be changed. They can be used like
+#	the dictionaries they replaced : f["name"], f["size"], f["icon"], f["version"], f["apple"], f["android"] etc.
+#	The platforms and types a file can have are declared in the table (allPlatforms, allTypes), so new ones (e.g.
+#	tvOS or watch icons) are just data.
+#
+class RequiredFile:
+	__slots__ = [ "name","size","type","icon","version","platforms","orientation","allPlatforms" ]
+	ORIENTATIONS = [ "any","portrait","landscape" ]
+
+	def __init__(self,definition,allPlatforms,allTypes):
+		for k,allowed,values in [ ("type",allTypes,[definition["type"]]), ("platforms",allPlatforms,definition["platforms"]),
+								  ("orientation",RequiredFile.ORIENTATIONS,[definition["orientation"]]) ]:
+			for v in values:
+				if v not in allowed:
+					raise ValueError("Unknown "+k+" '"+str(v)+"' for required file "+str(definition["name"]))
+		for k,v in [ ("name",definition["name"]), ("size",(definition["width"],definition["height"])),
+					 ("type",definition["type"]), ("icon",definition["type"] == "icon"), ("version",definition["version"]),
+					 ("platforms",frozenset(definition["platforms"])), ("orientation",definition["orientation"]),
+					 ("allPlatforms",allPlatforms) ]:
+			object.__setattr__(self,k,v)
+
+	def __setattr__(self,name,value):
+		raise AttributeError("Required file records cannot be changed")
+
+	def __getitem__(self,key):
+		if key in RequiredFile.__slots__:
+			return getattr(self,key)
+		if key in self.allPlatforms:
+			return key in self.platforms 													# e.g. f["apple"]
+		raise KeyError(key)
+
+	def __repr__(self):
+		return "RequiredFile("+self.name+")"
+
+#
+#	The table of required files, from requiredfiles.json, indexed by (type,platform,orientation). Each index entry
+#	is sorted by name, and results for several platforms are merged once and remembered, so a query only costs
+#	the size of its result. The file lists the platforms and types there are as well as the files.
+#
+class RequiredFilesTable:
+	FORMAT = 2 																				# format of the data file we read
+
+	def __init__(self,fileName):
+		data = json.load(open(fileName))
+		assert data["format"] == RequiredFilesTable.FORMAT,"Unsupported required files format in "+fileName
+		self.fileName = fileName 															# stages built from it depend on it
+		self.version = data["version"]
+		self.platforms = tuple(data["platforms"]) 											# e.g. apple, android
+		self.types = tuple(data["types"]) 													# e.g. icon, launch
+		allPlatforms = frozenset(self.platforms)
+		self.files = [RequiredFile(d,allPlatforms,self.types) for d in data["files"]]
+		names = [f.name for f in self.files]
+		assert len(names) == len(set(names)),"Duplicate entries in "+fileName 				# check nothing is there twice
+		self.orientations = ["portrait","landscape"]
+		self.index = {}
+		for f in self.files:
+			orientations = self.orientations if f.orientation == "any" else [f.orientation]
+			for p in f.platforms:
+				for o in orientations:
+					self.index.setdefault((f.type,p,o),[]).append(f)
+		for k in self.index.keys():
+			self.index[k] = tuple(sorted(self.index[k],key = lambda f: f.name))
+		for o in self.orientations: 														# at least one launch image each
+			assert sum([len(v) for k,v in self.index.items() if k[0] == "launch" and k[2] == o]) > 0
+		self.merged = {}
+
+	#
+	#	Files of a type for any of the platforms, sorted by name.
+	#
+	def query(self,fileType,platforms,orientation):
+		platforms = tuple(platforms)
+		for k,allowed,values in [ ("type",self.types,[fileType]), ("platform",self.platforms,platforms) ]:
+			for v in values:
+				if v not in allowed:
+					raise ValueError("Unknown required file "+k+" '"+str(v)+"', known are "+",".join(allowed))
+		if len(platforms) == 1:
+			return self.index.get((fileType,platforms[0],orientation),())
+		key = (fileType,platforms,orientation)
+		if key not in self.merged:
+			found = {}
+			for p in platforms:
+				for f in self.index.get((fileType,p,orientation),()):
+					found[f.name] = f
+			self.merged[key] = tuple([found[n] for n in sorted(found.keys())])
+		return self.merged[key]
+
+#
+#	The table is only loaded once per process.
+#
+loadedTable = None
+
+def requiredFilesTable():
+	global loadedTable
+	if loadedTable is None:
+		loadedTable = RequiredFilesTable(os.path.dirname(os.path.abspath(__file__))+os.sep+"requiredfiles.json")
+	return loadedTable
+
 #
 #	Class responsible for returning information on launch images/icons for iOS and Android.
 #
 class RequiredFilesInformation:
 	def __init__(self,orientation):
-		self.reqList = {}
 		self.orientation = orientation.lower()
-		self.launchCount = 0
-		self.addIcon("Icon-xxxhdpi.png",192,False,True)										# Android Icons.
-		self.addIcon("Icon-xxhdpi.png",144,False,True)
-		self.addIcon("Icon-xhdpi.png",96,False,True)
-		self.addIcon("Icon-hdpi.png",72,False,True)
-		self.addIcon("Icon-mdpi.png",48,False,True)
-		self.addIcon("Icon-ldpi.png",36,False,True)
-																							# List of suffix,sizes,base size
-		defList = [("",2,57),("-60",3,60),("-72",2,72),("-76",2,76),("-Small-40",3,40),("-Small-50",2,50),("-Small",3,29)]
-		for d in defList:																	# for each definition
-			for size in range(1,d[1]+1):													# for each size
-				iconFile = "Icon"+d[0]														# create file
-				if size > 1:
-					iconFile = iconFile + "@" + str(size)+"x"
-				self.addIcon(iconFile+".png",d[2] * size,True,False)						# add definition.
-
-		self.addLaunchImage("Default.png",320,480,True)										# Android and iOS launch images.								
-		self.addLaunchImage("Default-Portrait.png",768,1024,True)										
-		self.addLaunchImage("Default-Landscape.png",1024,768,True)										
-		self.addLaunchImage("Default@2x.png",320*2,480*2,True)										
-		self.addLaunchImage("Default-Portrait@2x.png",768*2,1024*2,True)										
-		self.addLaunchImage("Default-Landscape@2x.png",1024*2,768*2,True)										
-
-		self.addLaunchImage("Default-568h@2x.png",640,1136,False)							# iOS Specific Launch images.
-		self.addLaunchImage("Default-667h@2x.png",750,1334,False)
-		self.addLaunchImage("Default-736h@2x.png",1242,2208,False)
-		self.addLaunchImage("Default-Landscape-568h@2x.png",1136,640,False)
-		self.addLaunchImage("Default-Landscape-667h@2x.png",1334,750,False)
-		self.addLaunchImage("Default-Landscape-736h@2x.png",2208,1242,False)
-
-		assert(self.launchCount > 0)														# check there is at least one launch image
-
-	def addGraphic(self,fileName,width,height,isIOS,isAndroid):
-		newEntry = { "name":fileName,"size":(width,height),"apple":isIOS,"android":isAndroid,"icon":(width == height),"version":"7.0" }
-		if fileName[:7] == "Default":														# is it default with 667h or 736h in it
-			if fileName.find("667h") >= 0 or fileName.find("736h") >= 0:					# then if so it is version 8.0
-				newEntry["version"] = "8.0"
-		assert(fileName not in self.reqList)												# check not already present
-		self.reqList[fileName] = newEntry 													# add it to the database.
-
-	def addIcon(self,fileName,size,isIOS,isAndroid):
-		self.addGraphic(fileName,size,size,isIOS,isAndroid)
-
-	def addLaunchImage(self,fileName,width,height,isAndroid):
-		appLandscape = self.orientation == "landscape"										# app is landscape
-		liLandscape = width > height														# image is landscape
-		isAdded = appLandscape == liLandscape												# do we want it ?
-		if fileName == "Default-568h@2x.png":												# required by iOS activates iPhone 5 tall mode
-			isAdded = True 																	# http://docs.coronalabs.com/guide/distribution/buildSettings/index.html
-		if isAdded:																			# if we want it (e.g. fits app orientation)
-			self.addGraphic(fileName,width,height,True,isAndroid)
-			self.launchCount = self.launchCount + 1
+		self.table = requiredFilesTable()
+
+	#
+	#	Files of a type (e.g. "icon") for any of the named platforms (e.g. ["apple","appletv"])
+	#
+	def queryPlatforms(self,fileType,platforms):
+		return list(self.table.query(fileType,platforms,self.orientation))
 
 	def query(self,isIcon,isApple,isAndroid):
-		result = []
-		for k,v in self.reqList.items():
-			isOkay = isIcon == v["icon"] 
-			if ((isApple and v["apple"]) or (isAndroid and v["android"])) and isOkay:
-				result.append(v)
-		result.sort(key=lambda k: k['name'])
-		return result
+		platforms = ([ "apple" ] if isApple else []) + ([ "android" ] if isAndroid else [])
+		return self.queryPlatforms("icon" if isIcon else "launch",platforms)
+
+	#
+	#	Anything built from the table is rebuilt if it changes, so it is a source of those stages, and its version
+	#	goes in their generator.
+	#
+	def fileName(self):
+		return self.table.fileName
+
+	def version(self):
+		return self.table.version
 
 #  ****************************************************************************************************************
 # 		Date		Changes Made
 #		----		------------
 #		31 Dec 14 	First working version.
+#		18 Oct 26 	Table is now data (requiredfiles.json), loaded once and indexed, records are read only.
+#		18 Oct 26 	fileName() and version() of the table, for the build manifest.
+#		18 Oct 26 	Unknown keys, types, platforms and orientations are errors rather than False.
+#		18 Oct 26 	Platforms and types are declared in requiredfiles.json ; queryPlatforms() takes platform names.
 # 
 #  ****************************************************************************************************************
\ No newline at end of file
@@ -0,0 +1,207 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		scheduler.py
+# 		Purpose:	Runs build stages in dependency order, independent ones at the same time.
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+import os,sys,time,threading,contextlib,multiprocessing
+from concurrent.futures import ThreadPoolExecutor,ProcessPoolExecutor,Future,wait,FIRST_COMPLETED
+
+#
+#	One stage. It runs function() after all the stages it depends on have finished. inputs and outputs are
+#	the files (or directories) it reads and writes ; an output can be used to name the stage as a target.
+#
+class Stage:
+	def __init__(self,name,function,after = None,inputs = None,outputs = None):
+		self.name = name
+		self.function = function
+		self.after = after or [] 															# names of stages it needs
+		self.inputs = inputs or []
+		self.outputs = outputs or []
+
+#
+#	Stages running at the same time would mix up their output, so while they run anything printed by a stage's
+#	thread is collected and printed in one go when it finishes.
+#
+class StageOutput:
+	def __init__(self,stream):
+		self.stream = stream
+		self.local = threading.local()
+
+	def write(self,text):
+		buffer = getattr(self.local,"buffer",None)
+		if buffer is None:
+			return self.stream.write(text)
+		buffer.append(text)
+		return len(text)
+
+	def flush(self):
+		self.stream.flush()
+
+	def capture(self):
+		self.local.buffer = []
+
+	def release(self):
+		text = "".join(self.local.buffer)
+		self.local.buffer = None
+		return text
+
+#
+#	Worker processes are started when stages first use the pool, from their own threads. Forking a process with
+#	other threads running copies any lock one of them is holding at that moment, and a worker which needs it then
+#	hangs, so workers are started by a fork server where there is one. Only this pool uses it ; the start method
+#	of the process isn't changed.
+#
+def workerContext():
+	if "forkserver" in multiprocessing.get_all_start_methods():
+		return multiprocessing.get_context("forkserver")
+	return None 																			# default (spawn) elsewhere.
+
+#
+#	One pool of worker processes for all the stages of a build, so running them at once doesn't run more than
+#	workers processes. None if there's only one worker.
+#
+def workerPool(workers):
+	if workers <= 1:
+		return contextlib.nullcontext(None)
+	return ProcessPoolExecutor(max_workers = workers,mp_context = workerContext())
+
+#
+#	Run a function in a worker process, returning its result and the CPU time it took.
+#
+def timedCall(function,*args):
+	start = time.process_time()
+	result = function(*args)
+	return result,time.process_time()-start
+
+#
+#	One stage's view of the shared pool, which adds up the CPU time its jobs take in the workers, as that isn't
+#	in the CPU time of the build process. Used like the pool itself (submit and map).
+#
+class TimedPool:
+	def __init__(self,pool):
+		self.pool = pool
+		self.cpuTime = 0.0 																# seconds, of jobs finished.
+		self.lock = threading.Lock()
+
+	def submit(self,function,*args):
+		future = Future()
+		self.pool.submit(timedCall,function,*args).add_done_callback(lambda job: self.finished(job,future))
+		return future
+
+	def finished(self,job,future):
+		if job.cancelled():
+			future.cancel()
+		elif job.exception() is not None:
+			future.set_exception(job.exception())
+		else:
+			result,seconds = job.result()
+			with self.lock:
+				self.cpuTime += seconds
+			future.set_result(result)
+
+	def map(self,function,*iterables):
+		return [job.result() for job in [self.submit(function,*args) for args in zip(*iterables)]]
+
+#
+#	The pool for a library to use : the shared one if it was given one, otherwise one of its own.
+#
+def processPool(pool,workers):
+	if pool is not None:
+		return contextlib.nullcontext(pool)
+	return ProcessPoolExecutor(max_workers = workers)
+
+#
+#	A graph of stages. run() builds the targets asked for (and everything they need) or all of them, running any
+#	stages whose dependencies are done on a pool of threads, so the build takes as long as the longest chain of
+#	stages rather than all of them. The stages themselves do their heavy work in a shared pool of worker processes.
+#
+class StageScheduler:
+	def __init__(self,workers = 1):
+		self.workers = max(1,workers or 1)
+		self.stages = {} 																	# name => Stage, in order added.
+
+	def add(self,name,function,after = None,inputs = None,outputs = None):
+		assert name not in self.stages,"Duplicate stage "+name
+		for a in after or []:
+			assert a in self.stages,"Stage "+name+" depends on unknown stage "+a 			# so it can't have cycles
+		self.stages[name] = Stage(name,function,after,inputs,outputs)
+		return self
+
+	#
+	#	Find the stages for a target, which is a stage name or an output (which may be written by several).
+	#
+	def find(self,target):
+		if target in self.stages:
+			return [target]
+		names = [s.name for s in self.stages.values() if os.path.normpath(target) in s.outputs]
+		if len(names) == 0:
+			raise ValueError("Unknown target "+target+", targets are "+",".join(self.stages.keys()))
+		return names
+
+	#
+	#	The stages needed to build the targets, in the order they were added.
+	#
+	def required(self,targets = None):
+		if targets is None:
+			return list(self.stages.keys())
+		needed = set()
+		waiting = sum([self.find(t) for t in targets],[])
+		while len(waiting) > 0:
+			name = waiting.pop()
+			if name not in needed:
+				needed.add(name)
+				waiting += self.stages[name].after
+		return [n for n in self.stages.keys() if n in needed]
+
+	def run(self,targets = None):
+		order = self.required(targets)
+		if self.workers <= 1:																# one at a time, in order.
+			for name in order:
+				self.stages[name].function()
+			return order
+		done = set()
+		running = {}
+		output = StageOutput(sys.stdout)
+		sys.stdout = output
+		try:
+			with ThreadPoolExecutor(max_workers = len(order)) as pool:
+				while len(done) < len(order):
+					for name in order: 														# start anything which can be.
+						if name not in done and name not in running.values():
+							if all([a in done for a in self.stages[name].after]):
+								running[pool.submit(self.runStage,output,name)] = name
+					finished,pending = wait(list(running.keys()),return_when = FIRST_COMPLETED)
+					for job in finished:
+						name = running.pop(job)
+						text,error = job.result()
+						output.stream.write(text)
+						if error is not None: 												# after printing what it did.
+							raise error
+						done.add(name)
+		finally:
+			sys.stdout = output.stream
+		return order
+
+	def runStage(self,output,name):
+		output.capture()
+		try:
+			self.stages[name].function()
+			error = None
+		except Exception as e:
+			error = e
+		return output.release(),error
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	Shared worker pool, using a fork server, rather than changing the start method of the process.
+#		18 Oct 26 	TimedPool, for the CPU time of each stage's jobs.
+# 
+#  ****************************************************************************************************************
@@ -9,19 +9,204 @@
 #  ****************************************************************************************************************
 #  ****************************************************************************************************************
 
+import os,time
+from concurrent.futures import wait,FIRST_COMPLETED
+from libraries.scheduler import processPool
 from libraries.copier import FileCopier 
+from libraries.manifest import hashFile
 from libraries.information import InformationLoader
+from libraries.formatter import LuaFormatter
+from libraries.compactlua import CompactLuaWriter,findLuac,compileLua
 
-class TextCopier(FileCopier):
-	def copyFile(self,srcFile,tgtFile):
-		tgtFile = tgtFile[:-4]+".lua"														# it's a lua file that is created.
-		inf = InformationLoader()															# processing object
+#
+#	Convert one file. This is used for both serial and batch conversion so the output is the same either way.
+#	Compact files have to be loaded completely, so files too big to load are streamed as normal.
+#
+def convertFile(inf,srcFile,tgtFile,streamSize,compact = False,luac = None):
+	if streamSize is not None and os.path.getsize(srcFile) >= streamSize:
+		with open(tgtFile,"w",encoding = "utf-8") as stream:								# too big, stream it.
+			inf.stream(srcFile,stream,{ "sourceFile":srcFile })
+	elif compact:
+		data = inf.load(srcFile,{ "sourceFile":srcFile })
+		with open(tgtFile,"w",encoding = "utf-8") as stream:
+			CompactLuaWriter().write(stream,data)
+	else:
 		data = inf.load(srcFile,{ "sourceFile":srcFile })									# load in the text
 		inf.write(tgtFile,"return",data)													# write it out as a requireable file in media.
+	if luac is not None:
+		compileLua(luac,tgtFile)
+
+#
+#	Convert one file, timed, returning (source,target,seconds,error or None) ; failures are reported, not raised.
+#
+def convertTimed(inf,srcFile,tgtFile,streamSize,compact = False,luac = None):
+	start = time.time()
+	try:
+		convertFile(inf,srcFile,tgtFile,streamSize,compact,luac)
+		return (srcFile,tgtFile,time.time()-start,None)
+	except Exception as e:
+		return (srcFile,tgtFile,time.time()-start,repr(e))
+
+#
+#	Batch worker processes have one InformationLoader (and LuaFormatter) each, used for every file they convert.
+#	It is made by the first conversion, as the pool may be shared with other stages.
+#
+workerLoader = None
+
+def convertWorker(srcFile,tgtFile,streamSize,compact = False,luac = None):
+	global workerLoader
+	if workerLoader is None:
+		workerLoader = InformationLoader()
+	return convertTimed(workerLoader,srcFile,tgtFile,streamSize,compact,luac)
+
+#
+#	Result of a conversion ; time taken for each file and any which failed.
+#
+class ConversionReport:
+	def __init__(self):
+		self.timings = [] 																	# (source,target,seconds)
+		self.failures = [] 																	# (source,error)
+		self.elapsed = 0.0 																	# time for the whole batch.
+
+	def add(self,srcFile,tgtFile,seconds,error):
+		if error is None:
+			self.timings.append((srcFile,tgtFile,seconds))
+		else:
+			self.failures.append((srcFile,error))
+
+	def summary(self):
+		total = sum([t[2] for t in self.timings])
+		return "{0} files converted ({1:.2f}s of work in {2:.2f}s), {3} failed".format(len(self.timings),total,self.elapsed,len(self.failures))
+
+#
+#	Copies XML files converting them to requireable Lua modules. Files of streamSize bytes or more are converted
+#	incrementally so they are never all in memory. With more than one worker files are converted in a process pool.
+#	If there is a content cache, files converted before (by this app or another one) are just copied from it.
+#
+#	If compact is set the files are written by CompactLuaWriter, and compiled if a Lua 5.1 luac is found.
+#
+#	Either way every file is tried ; those which fail are listed and then a RuntimeError is raised.
+#
+class TextCopier(FileCopier):
+	def __init__(self,source,workers = 1,streamSize = None,cache = None,compact = False,pool = None):
+		FileCopier.__init__(self,source,workers,False,cache)
+		self.pool = pool 																	# shared worker pool, if any.
+		self.streamSize = streamSize 														# size at which we stream, None never.
+		self.compact = compact 																# write compact Lua.
+		self.luac = findLuac() if compact else None 										# compiler, if there is one.
+		self.loader = InformationLoader()													# processing object for serial conversion.
+		self.lastReport = None 																# report from last batch conversion.
+
+	#
+	#	Includes the version of the writer, so files are converted again when its output changes.
+	#
+	def generator(self):
+		generator = FileCopier.generator(self)+":"+str(self.streamSize)+":"+str(LuaFormatter.VERSION)+":"+str(InformationLoader.STREAMVERSION)
+		if self.compact:
+			return generator+":compact:"+str(CompactLuaWriter.VERSION)+(":luac" if self.luac is not None else "")
+		return generator
+
+	def targetFile(self,tgtFile):
+		return tgtFile[:-4]+".lua"															# it's a lua file that is created.
+
+	def isCurrent(self,srcFile,outFile):													# converted, so can only check it is newer
+		return os.path.isfile(outFile) and os.stat(outFile).st_mtime >= os.stat(srcFile).st_mtime
+
+	def copyFile(self,srcFile,tgtFile):
+		convertFile(self.loader,srcFile,self.targetFile(tgtFile),self.streamSize,self.compact,self.luac)
+
+	#
+	#	The source file name goes into the converted file, so it is part of the key.
+	#
+	def cacheKey(self,srcFile):
+		return self.cache.key(self.generator(),srcFile,hashFile(srcFile))
+
+	#
+	#	Converting is CPU bound, so more than one worker uses the batch conversion rather than threads. Anything in
+	#	the cache is fetched first, and anything converted is added to it.
+	#
+	def copyAll(self,jobs):
+		if self.cache is not None:
+			jobs = [j for j in jobs if not self.fetchCached(j[0],j[1])]
+		self.convertAll(jobs)
+		if self.cache is not None:
+			for srcFile,tgtFile in jobs:
+				self.cache.store(self.cacheKey(srcFile),".lua",self.targetFile(tgtFile))
+
+	def fetchCached(self,srcFile,tgtFile):
+		start = time.time()
+		outFile = self.targetFile(tgtFile)
+		if not self.cache.fetch(self.cacheKey(srcFile),".lua",outFile):
+			return False
+		self.timings.append((outFile,time.time()-start,os.path.getsize(outFile)))
+		return True
+
+	def convertAll(self,jobs):
+		if self.workers <= 1 or len(jobs) <= 1:
+			self.lastReport = self.convertSerial(jobs)
+		else:
+			self.lastReport = self.convertBatch(jobs,self.workers)
+		self.timings += [(t[1],t[2],os.path.getsize(t[1])) for t in self.lastReport.timings]
+		for srcFile,error in sorted(self.lastReport.failures):
+			print('        Error : converting "'+srcFile+'" '+error)
+		if len(self.lastReport.failures) > 0:
+			raise RuntimeError("Text conversion failed for {0} of {1} files.".format(len(self.lastReport.failures),len(jobs)))
+
+	#
+	#	Convert a list of (source,target) pairs one at a time, reporting failures the same way as a batch.
+	#
+	def convertSerial(self,jobs):
+		report = ConversionReport()
+		start = time.time()
+		for srcFile,tgtFile in jobs:
+			report.add(*convertTimed(self.loader,srcFile,self.targetFile(tgtFile),self.streamSize,self.compact,self.luac))
+		report.elapsed = time.time()-start
+		return report
+
+	#
+	#	Convert a list of (source,target) pairs in a pool of processes, with no more than maxPending files queued
+	#	at once. Failures are reported rather than raised.
+	#
+	def convertBatch(self,jobs,workers,maxPending = None):
+		maxPending = maxPending or workers * 4
+		report = ConversionReport()
+		start = time.time()
+		with processPool(self.pool,workers) as pool:
+			pending = set()
+			for srcFile,tgtFile in jobs:
+				if len(pending) >= maxPending:												# wait for space.
+					done,pending = wait(pending,return_when = FIRST_COMPLETED)
+					for job in done:
+						report.add(*job.result())
+				pending.add(pool.submit(convertWorker,srcFile,self.targetFile(tgtFile),self.streamSize,self.compact,self.luac))
+			for job in wait(pending)[0]:													# and the rest.
+				report.add(*job.result())
+		report.elapsed = time.time()-start
+		return report
+
+	#
+	#	Compact output also reports how big the Lua is compared to the text it came from.
+	#
+	def report(self):
+		if not self.compact or len(self.timings) == 0:
+			return FileCopier.report(self)
+		written = sum([t[2] for t in self.timings])
+		return FileCopier.report(self)+", {0} bytes of {1} ({2:.0f}%)".format(written,"bytecode" if self.luac is not None else "compact Lua",100.0*written/max(1,self.bytesCopied))
 
 #  ****************************************************************************************************************
 # 		Date		Changes Made
 #		----		------------
 #		14 Jan 15 	First working version.
+#		18 Oct 26 	targetFile() gives the name of the .lua file created.
+#		18 Oct 26 	isCurrent() for converted files.
+#		18 Oct 26 	Large files are converted using streaming.
+#		18 Oct 26 	Batch conversion across a process pool, with a report of timings and failures.
+#		18 Oct 26 	Batch timings added to timings.
+#		18 Oct 26 	Converted files kept in an optional shared content cache.
+#		18 Oct 26 	Optional compact output (CompactLuaWriter), compiled with luac if there is one.
+#		18 Oct 26 	Batch conversion can use a shared worker pool.
+#		18 Oct 26 	Serial conversion reports failures like a batch, all of them, then raises a RuntimeError.
+#		18 Oct 26 	Writer versions are part of the generator.
+#		18 Oct 26 	Streaming format version in the generator.
 # 
-#  ****************************************************************************************************************
\ No newline at end of file
+#  ****************************************************************************************************************
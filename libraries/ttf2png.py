@@ -9,8 +9,57 @@
 #  ****************************************************************************************************************
 #  ****************************************************************************************************************
 
-from PIL import Image,ImageFont, ImageDraw,ImageOps
-import math
+from PIL import Image,ImageFont, ImageDraw,ImageFilter,ImageChops
+import os,io
+from concurrent.futures import ProcessPoolExecutor
+from libraries.formatter import LuaFormatter
+from libraries.binpacker import packRectangles
+
+#
+#	Size of text in a font. getsize() was removed in Pillow 10, the bounding box from the origin is the same thing.
+#
+def textSize(font,text):
+	if hasattr(font,"getsize"):
+		return font.getsize(text)
+	box = font.getbbox(text)
+	return (box[2],box[3])
+
+#
+#	Glyph masks and sizes are cached here, keyed on (font name, size, mapped character), so each glyph is only
+#	rasterised once however many times it is measured or drawn, and by however many FontSources.
+#
+glyphCache = {}
+
+#
+#	The TTF file is read once per process, and each size of it is only created once, however many FontSources use it.
+#
+fontData = {}
+faceCache = {}
+
+def loadFace(font,workingSize):
+	key = (font,workingSize)
+	if key not in faceCache:
+		if font not in fontData:
+			fontData[font] = open(font+".ttf","rb").read()
+		faceCache[key] = ImageFont.truetype(io.BytesIO(fontData[font]),workingSize)
+	return faceCache[key]
+
+#
+#	Grow a mask by radius pixels in all directions (morphological dilation). Alternating square and cross steps
+#	gives an octagon, which is close enough to a circle. The mask is enlarged by radius on each side first.
+#
+def dilateMask(mask,radius):
+	grown = Image.new("L",(mask.size[0]+radius*2,mask.size[1]+radius*2),0)
+	grown.paste(mask,(radius,radius))
+	for i in range(0,radius):
+		if i % 2 == 0:
+			grown = grown.filter(ImageFilter.MaxFilter(3))
+		else:
+			cross = grown
+			for dx,dy in [(1,0),(-1,0),(0,1),(0,-1)]:
+				cross = ImageChops.lighter(cross,ImageChops.offset(grown,dx,dy))
+			grown = cross
+	return grown
 
 #
 #	Class representing a font ; can get information on and render characters onto a Pillow Draw Surface
@@ -22,14 +71,11 @@ class FontSource:
 		self.fontName = font 														# the font being used
 		self.extendedMapping = mapping or {}										# mapping non ASCII -> other fonts.
 		self.workingSize = workingSize 												# base size being generated (scaled obviously)
-		self.font = ImageFont.truetype(font+".ttf",workingSize)						# create an instance of the font.
+		self.font = loadFace(font,workingSize)										# get an instance of the font.
 		self.setFontColour((255,255,255,255)) 										# white, no border, no drop shadow.
 		self.border = 0
 		self.dropShadow = 0
-
-	def __del__(self):
-		if self.font != None:														# if font is not None, delete it
-			del self.font
+		self.debug = False 															# draw boxes round the characters.
 
 	def map(self,character):														# map character to other characters.
 		return self.extendedMapping[character] if character in self.extendedMapping else character
@@ -37,7 +83,7 @@ class FontSource:
 	def getMaxHeight(self,startChar,endChar):
 		maxHeight = 0 																# figure out the tallest character
 		for i in range(startChar,endChar+1): 										# for AGK all characters will be the same
-			maxHeight = max(maxHeight,self.size(self.map(chr(i)))[1])				# height in rendering
+			maxHeight = max(maxHeight,self.size(chr(i))[1])							# height in rendering
 		return maxHeight
 
 	def setFontColour(self,colour):
@@ -51,51 +97,160 @@ class FontSource:
 		self.dropShadow = max(1,size * self.workingSize / 100) 						# drop shadow offset.
 		self.dropColour = colour
 
+	#
+	#	Get the mask of a mapped character, and the dilated version for the border, from the cache.
+	#
+	def glyph(self,character):
+		key = (self.fontName,self.workingSize,character)
+		if key not in glyphCache:
+			size = textSize(self.font,character)
+			mask = Image.new("L",(max(1,size[0]),max(1,size[1])),0)					# render it once.
+			ImageDraw.Draw(mask).text((0,0),character,font = self.font,fill = 255)
+			glyphCache[key] = { "size":size, "mask":mask, "dilated":{} }
+		return glyphCache[key]
+
+	def borderMask(self,character):
+		radius = int(round(self.border))
+		entry = self.glyph(character)
+		if radius not in entry["dilated"]:
+			entry["dilated"][radius] = dilateMask(entry["mask"],radius)
+		return entry["dilated"][radius]
+
 	def size(self,character):	
-		size = self.font.getsize(self.map(character))								# get the character size
+		size = self.glyph(self.map(character))["size"]								# get the character size
 		width = size[0] + self.dropShadow + self.border * 2 						# allow for border and drop shadow. 			
 		height = size[1] + self.dropShadow + self.border * 2
 		return (int(width+0.7),int(height+0.7))
 
+	#
+	#	Draw a character. The glyph is rasterised once ; the shadow is the same mask offset, the border is the mask
+	#	dilated by the border size, and they are all drawn with draw.bitmap() which is what draw.text() does.
+	#
 	def render(self,draw,position,character):
 		size = self.size(character)													# get the character
 		character = self.map(character)												# map character
+		mask = self.glyph(character)["mask"]
+		x = int(round(position[0]))
+		y = int(round(position[1]))
+		border = int(round(self.border))
 		if self.dropShadow > 0:														# Draw drop shadow
-			draw.text((position[0]+self.border*2+self.dropShadow,position[1]+self.border*2+self.dropShadow), character,font = self.font, fill = self.dropColour)
-		if self.border > 0:															# Cheat to draw border
-			for i in range(0,46):
-				angle = math.radians(i*360/45)
-				draw.text((position[0]+self.border+self.border*math.cos(angle),position[1]+self.border+self.border*math.sin(angle)),character,font = self.font, fill = self.borderColour)
+			offset = int(round(self.border*2+self.dropShadow))
+			draw.bitmap((x+offset,y+offset),mask,fill = self.dropColour)
+		if self.border > 0:															# Draw border
+			draw.bitmap((x,y),self.borderMask(character),fill = self.borderColour)
 																					# The character
-		draw.text((position[0]+self.border,position[1]+self.border),character,font = self.font, fill = self.fontColour)
+		draw.bitmap((x+border,y+border),mask,fill = self.fontColour)
 																					# Debugging rectangle
-		if True:
+		if self.debug:
 			draw.rectangle((position[0],position[1],position[0]+size[0]-1,position[1]+size[1]-1),outline = (255,0,0,255))
 
-fs = FontSource("BroadW",{ "A":"*","*":"A",chr(23):"X" },64)
-fs.setFontColour((255,255,0,255))
-fs.setBorder((0,0,0,255),6)
-fs.setDropShadow((128,128,128,255),6)
-
-image = Image.new("RGBA",(512,800),(255,255,255,0))
-draw = ImageDraw.Draw(image)
-h = fs.getMaxHeight(32,127)
-x = 0
-y = 0
-for i in range(0,255):
-	size = fs.size(chr(i))
-	if x + size[0] >= 510:
-		x = 0
-		y = y + h
-	fs.render(draw,(x,y),chr(i))
-	x = x + size[0]+2
-image.show()
-#del image
+#
+#	Builds a bitmap font from a FontSource : packs the glyphs into one or more texture pages and writes them out
+#	as <name>.png (<name>_2.png etc. if it spills onto more pages) and <name>.lua, a requireable table of glyph
+#	positions and sizes keyed on character code.
+#
+class FontAtlas:
+	def __init__(self,fontSource,characters,maxSize = 1024,powerOfTwo = True,padding = 2):
+		self.fontSource = fontSource
+		self.characters = [c for c in characters if fontSource.size(c)[0] > 0]	 		# things we can draw
+		sizes = { ord(c):fontSource.size(c) for c in self.characters }
+		self.pages = packRectangles(sizes,maxSize,padding,powerOfTwo)					# pack them.
+
+	#
+	#	Render and write the page images and the metrics file.
+	#
+	def write(self,baseName):
+		pageNames = []
+		glyphs = {}
+		for n,page in enumerate(self.pages):
+			image = Image.new("RGBA",page["size"],(255,255,255,0))
+			draw = ImageDraw.Draw(image)
+			for code,rect in page["placed"].items():									# draw each glyph in its space
+				self.fontSource.render(draw,(rect[0],rect[1]),chr(code))
+				glyphs[code] = { "page":n+1, "x":rect[0], "y":rect[1], "width":rect[2], "height":rect[3] }
+			pageName = baseName+("" if n == 0 else "_"+str(n+1))+".png"
+			image.save(pageName)
+			pageNames.append(os.path.basename(pageName))
+		metrics = { "font":self.fontSource.fontName, "size":self.fontSource.workingSize, "pages":pageNames,
+					"pageSizes":[list(p["size"]) for p in self.pages], "characters":glyphs,
+					"lineHeight":max([g["height"] for g in glyphs.values()]) if len(glyphs) > 0 else 0 }
+		with open(baseName+".lua","w",encoding = "utf-8") as stream:
+			LuaFormatter().luaWrite(stream,0,"return",metrics)
+		return pageNames
+
+#
+#	Make a bitmap font in one call : characters startChar to endChar of the font source, written to baseName.png/.lua
+#
+def buildFontAtlas(fontSource,baseName,startChar = 32,endChar = 126,maxSize = 1024,powerOfTwo = True,padding = 2):
+	characters = [chr(c) for c in range(startChar,endChar+1)]
+	return FontAtlas(fontSource,characters,maxSize,powerOfTwo,padding).write(baseName)
+
+#
+#	Apply a style to a font source. A style is a dictionary with any of fontColour:colour, border:(colour,size)
+#	and dropShadow:(colour,size), sizes being percentages of the font size as usual.
+#
+def applyStyle(fontSource,style):
+	if "fontColour" in style:
+		fontSource.setFontColour(style["fontColour"])
+	if "border" in style:
+		fontSource.setBorder(style["border"][0],style["border"][1])
+	if "dropShadow" in style:
+		fontSource.setDropShadow(style["dropShadow"][0],style["dropShadow"][1])
+	return fontSource
+
+#
+#	Write every style of one size. The glyphs are rasterised once for the size and shared by all the styles, as the
+#	glyph cache doesn't depend on colours. Run in a worker process by exportFontVariants().
+#
+def exportFontSize(font,mapping,workingSize,styles,characters,maxSize,powerOfTwo,padding):
+	written = []
+	for baseName,style in styles:
+		fontSource = applyStyle(FontSource(font,mapping,workingSize),style)
+		written += FontAtlas(fontSource,characters,maxSize,powerOfTwo,padding).write(baseName)
+	return written
+
+#
+#	Export a font in several variants in one go. variants is a list of (size,style), each written to
+#	<baseName><suffix>_<size>.png/.lua, where suffix is the style's "suffix" entry if any (e.g. "@2x" or "_outline")
+#	The character mapping is resolved once for all of them, and the sizes are rendered in parallel.
+#
+#	Returns the list of page files written.
+#
+def exportFontVariants(font,baseName,variants,mapping = None,startChar = 32,endChar = 126,workers = 1,maxSize = 1024,powerOfTwo = True,padding = 2):
+	characters = [chr(c) for c in range(startChar,endChar+1)]
+	mapping = mapping or {}
+	resolved = { c:mapping[c] for c in characters if c in mapping } 					# only the mappings we use.
+	sizes = {} 																			# size => [(name,style)]
+	for workingSize,style in variants:
+		name = baseName+style.get("suffix","")+"_"+str(workingSize)
+		sizes.setdefault(workingSize,[]).append((name,style))
+	order = sorted(sizes.keys(),reverse = True) 										# biggest (slowest) first.
+	written = []
+	if workers <= 1 or len(order) <= 1:
+		for s in order:
+			written += exportFontSize(font,resolved,s,sizes[s],characters,maxSize,powerOfTwo,padding)
+		return written
+	with ProcessPoolExecutor(max_workers = min(workers,len(order))) as pool:
+		jobs = [pool.submit(exportFontSize,font,resolved,s,sizes[s],characters,maxSize,powerOfTwo,padding) for s in order]
+		for job in jobs:
+			written += job.result()
+	return written
 
+if __name__ == "__main__":
+	fs = FontSource("BroadW",{ "A":"*","*":"A",chr(23):"X" },64)
+	fs.setFontColour((255,255,0,255))
+	fs.setBorder((0,0,0,255),6)
+	fs.setDropShadow((128,128,128,255),6)
+	buildFontAtlas(fs,"broadw",1,126)
 
 #  ****************************************************************************************************************
 # 		Date		Changes Made
 #		----		------------
 #		23 Nov 14 	First working version.
+#		18 Oct 26 	FontAtlas/buildFontAtlas pack glyphs (MaxRects) into texture pages and write png + lua metrics.
+#					The test code at the end only runs as a main program.
+#		18 Oct 26 	Glyphs rasterised once and cached ; border by dilating the mask, shadow by offsetting it.
+#		18 Oct 26 	exportFontVariants() writes many sizes/styles of a font in one go, TTF only loaded once.
+#		18 Oct 26 	Unused imports removed.
 # 
 #  ****************************************************************************************************************
\ No newline at end of file
@@ -0,0 +1,175 @@
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+# 
+# 		File:		watcher.py
+# 		Purpose:	Watches files and directories for changes (inotify on Linux, polling anywhere else)
+# 		Author:		agent
+# 		Created:	18-Oct-26
+# 
+#  ****************************************************************************************************************
+#  ****************************************************************************************************************
+
+import os,time,select,struct,ctypes,ctypes.util
+
+#
+#	inotify event masks.
+#
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+
+#
+#	Base class. Watches a list of paths, which are either directories (watched with everything in them) or files.
+#	wait() blocks until something changes, then waits until nothing has changed for debounce seconds, so an
+#	editor saving or a burst of files being copied in is one change. It returns the changed paths, never an empty
+#	list ; events for files which aren't watched (in the directory of a watched file) are ignored.
+#
+class FileWatcher:
+	def __init__(self,paths):
+		self.paths = paths
+
+	def wait(self,debounce = 0.3):
+		changed = set()
+		while len(changed) == 0: 															# wait for the first change.
+			changed = self.changes(None)
+		while True:
+			more = self.changes(debounce)													# until it goes quiet.
+			if len(more) == 0:
+				return sorted(changed)
+			changed |= more
+
+	def close(self):
+		pass
+
+#
+#	Watcher which checks the size and time of every file every interval seconds.
+#
+class PollingWatcher(FileWatcher):
+	def __init__(self,paths,interval = 1.0):
+		FileWatcher.__init__(self,paths)
+		self.interval = interval
+		self.state = self.snapshot()
+
+	def snapshot(self):
+		state = {}
+		for p in self.paths:
+			if os.path.isdir(p):
+				for root,dirs,files in os.walk(p):
+					for f in files:
+						self.addState(state,os.path.join(root,f))
+			else:
+				self.addState(state,p)
+		return state
+
+	def addState(self,state,fileName):
+		try:
+			stat = os.stat(fileName)
+			state[fileName] = (stat.st_size,stat.st_mtime)
+		except OSError: 																	# gone since it was listed.
+			pass
+
+	#
+	#	Changed files, waiting up to timeout seconds (None for ever) for something to change.
+	#
+	def changes(self,timeout):
+		start = time.time()
+		while True:
+			time.sleep(self.interval if timeout is None else min(self.interval,timeout))
+			state = self.snapshot()
+			changed = set([f for f in set(state.keys()) | set(self.state.keys()) if state.get(f) != self.state.get(f)])
+			self.state = state
+			if len(changed) > 0 or (timeout is not None and time.time()-start >= timeout):
+				return changed
+
+#
+#	Watcher using Linux inotify through ctypes. Every directory is watched (new ones as they appear) ; a file on
+#	its own is watched through its directory, as editors often save by renaming a new file over the old one.
+#
+class InotifyWatcher(FileWatcher):
+	MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+	def __init__(self,paths):
+		FileWatcher.__init__(self,paths)
+		self.libc = ctypes.CDLL(ctypes.util.find_library("c"),use_errno = True)
+		self.fd = self.libc.inotify_init1(IN_NONBLOCK)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(),"inotify_init1 failed")
+		self.directories = {} 																# watch descriptor => directory
+		self.files = {} 																	# directory => files wanted, None all
+		for p in paths:
+			if os.path.isdir(p):
+				self.watchTree(p)
+			else:
+				directory = os.path.dirname(p)
+				if self.files.get(directory,set()) is not None:
+					self.files.setdefault(directory,set()).add(os.path.basename(p))
+				self.watch(directory)
+
+	def watchTree(self,directory):
+		for root,dirs,files in os.walk(directory):
+			self.files[root] = None
+			self.watch(root)
+
+	def watch(self,directory):
+		wd = self.libc.inotify_add_watch(self.fd,os.fsencode(directory or "."),InotifyWatcher.MASK)
+		if wd < 0:
+			raise OSError(ctypes.get_errno(),"inotify_add_watch failed on "+directory)
+		self.directories[wd] = directory
+
+	def changes(self,timeout):
+		if len(select.select([self.fd],[],[],timeout)[0]) == 0:
+			return set()
+		changed = set()
+		data = os.read(self.fd,65536)
+		offset = 0
+		while offset < len(data):
+			wd,mask,cookie,length = struct.unpack_from("iIII",data,offset)
+			name = data[offset+16:offset+16+length].rstrip(b"\0").decode("utf-8","replace")
+			offset += 16+length
+			if mask & IN_Q_OVERFLOW: 														# lost track, rebuild everything.
+				changed |= set(self.paths)
+				continue
+			directory = self.directories.get(wd)
+			if directory is None or name == "":
+				continue
+			wanted = self.files.get(directory)
+			if wanted is not None and name not in wanted: 									# not a file we are watching.
+				continue
+			path = os.path.join(directory,name)
+			if mask & IN_ISDIR:
+				if mask & (IN_CREATE | IN_MOVED_TO) and os.path.isdir(path):				# watch new directories too.
+					self.watchTree(path)
+					for root,dirs,files in os.walk(path):
+						changed |= set([os.path.join(root,f) for f in files])
+			else:
+				changed.add(path)
+		return changed
+
+	def close(self):
+		os.close(self.fd)
+
+#
+#	Get the best watcher available.
+#
+def createWatcher(paths,polling = False):
+	if not polling and hasattr(select,"select") and ctypes.util.find_library("c") is not None:
+		try:
+			return InotifyWatcher(paths)
+		except (OSError,AttributeError):													# not Linux, or no watches left.
+			pass
+	return PollingWatcher(paths)
+
+#  ****************************************************************************************************************
+# 		Date		Changes Made
+#		----		------------
+#		18 Oct 26 	First working version.
+#		18 Oct 26 	wait() keeps waiting if the only events were for files not being watched.
+# 
+#  ****************************************************************************************************************
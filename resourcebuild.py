@@ -14,51 +14,317 @@
 from libraries.configurator import ConfigGenerator 
 from libraries.information import InformationLoader
 from libraries.defaultfiles import DefaultFiles 
-from libraries.copier import FileCopier
+from libraries.audiocopier import AudioCopier
 from libraries.textcopier import TextCopier
-import os 
+from libraries.manifest import BuildManifest
+from libraries.buildprofiler import BuildProfiler
+from libraries.contentcache import ContentCache
+from libraries.watcher import createWatcher
+from libraries.pngoptimiser import PngOptimiser
+from libraries.graphicsimport import GraphicsImporter,imageSuffixes
+from libraries.scheduler import StageScheduler,workerPool
+from libraries.assetindex import AssetIndex
+import os,argparse,cProfile,traceback
+
 #
-#	Convert information.txt to lua equivalent.
+#	Builds the resources of the app in the current directory. If a cache directory is given (fleetbuild.py shares
+#	one between all its apps) converted text and copied sounds are kept in it as well as scaled artwork.
 #
-print("Creating          : information.lua")
-info = InformationLoader().loadInfo().generate("source")
-print('Adverts supported : "'+info.getSupportedAdverts()+'"')
+#	Each part of the build is a method, so in watch mode just the parts affected by a change can be rebuilt, with
+#	the information, required files and loaded artwork kept from the previous build.
 #
-#	Display orientation
+#	If optimisePng is set the icons and launch images are made as small as possible. If compactText is set text
+#	files are written as compact Lua (see compactlua.py) which is smaller and quicker to load.
 #
-orientation = info.get("application","orientation").lower()
-assert orientation == "portrait" or orientation == "landscape"
-print('Orientation is    : "'+orientation+'"')
+#	Graphics are made at each of DENSITIES (@1x,@2x,@4x) there are masters for, and config.lua tells Corona when
+#	to use which, so config is made after the graphics.
 #
-#	Generate build.settings and config.lua
+#	The stages are run by a StageScheduler ; only config and the icons need the information, so everything else
+#	runs at the same time as them. A build can be limited to some targets (stage names or outputs). All the stages
+#	share one pool of worker processes, so a build never has more than workers of them.
 #
-print("Creating          : build.settings,config.lua")
-cg = ConfigGenerator(orientation).generate("source",info.getSupportedAdverts())
+class ResourceBuilder:
+	DENSITIES = (1,2,4)
+
+	def __init__(self,workers,profiler = None,cacheDirectory = None,optimisePng = False,compactText = False):
+		self.workers = workers
+		self.optimisePng = optimisePng
+		self.compactText = compactText
+		self.profiler = profiler or BuildProfiler() 									# records time/memory of each stage.
+		self.sharedCache = ContentCache(cacheDirectory) if cacheDirectory is not None else None
+		self.cacheDirectory = cacheDirectory or "temp"+os.sep+"cache"
+		#
+		#	The build manifest records what was built from what, so anything unchanged since the last build is
+		#	skipped. Delete temp/resources.manifest to force a complete rebuild.
+		#
+		self.manifest = BuildManifest("temp"+os.sep+"resources.manifest")
+		self.info = None
+		self.defaultFiles = None
+		self.pool = None 																# shared worker pool during a build.
+		self.graphicsDensities = (1,) 													# densities the graphics were made at.
+
+	def build(self,targets = None):
+		scheduler = self.scheduler()
+		self.profiler.concurrent = scheduler.workers > 1
+		with workerPool(scheduler.workers) as self.pool:
+			scheduler.run(targets)
+		self.pool = None
+		self.manifest.save() 															# Save the manifest for next time.
+		if self.sharedCache is None: 													# a shared one is pruned by its owner.
+			pruneCache(self.cacheDirectory)
+		return self.profiler
+
+	#
+	#	The stages of the build, what each needs and what it reads and writes.
+	#
+	def scheduler(self):
+		scheduler = StageScheduler(self.workers)
+		scheduler.add("information",self.information,[],["information.xml"],["source"+os.sep+"information.lua"])
+		scheduler.add("graphics",self.graphics,[],["media"+os.sep+"graphics"],["source"+os.sep+"media","source"+os.sep+"media"+os.sep+"atlases"])
+		scheduler.add("config",self.config,["information","graphics"],[],["source"+os.sep+"config.lua","source"+os.sep+"build.settings"])
+		scheduler.add("icons",self.icons,["information"],["media"+os.sep+"system"],["source"])
+		scheduler.add("text",self.text,[],["media"+os.sep+"text"],["source"+os.sep+"media"])
+		scheduler.add("sounds",self.sounds,[],["media"+os.sep+"sounds"],["source"+os.sep+"media"])
+		after = list(scheduler.stages.keys()) 											# reads what all of them recorded
+		scheduler.add("index",self.index,after,["source"+os.sep+"media"],["source"+os.sep+"media"+os.sep+"assetindex.lua"])
+		return scheduler
+
+	#
+	#	Convert information.txt to lua equivalent, and get the display orientation.
+	#
+	def information(self):
+		print("Creating          : information.lua")
+		with self.profiler.stage("information") as stage:
+			self.info = InformationLoader().loadInfo().generate("source",self.manifest)
+			stage.addOutputs(["source"+os.sep+"information.lua"])
+		print('Adverts supported : "'+self.info.getSupportedAdverts()+'"')
+		self.orientation = self.info.get("application","orientation").lower()
+		assert self.orientation == "portrait" or self.orientation == "landscape"
+		print('Orientation is    : "'+self.orientation+'"')
+
+	#
+	#	Generate build.settings and config.lua
+	#
+	def config(self):
+		print("Creating          : build.settings,config.lua")
+		with self.profiler.stage("config") as stage:
+			ConfigGenerator(self.orientation,imageSuffixes(self.graphicsDensities)).generate("source",self.info.getSupportedAdverts(),self.manifest)
+			stage.addOutputs(["source"+os.sep+"config.lua","source"+os.sep+"build.settings"])
+
+	#
+	#	Create Application Icons and Launch Images. If only some masters have changed, the others stay loaded.
+	#
+	def icons(self,changedFiles = None):
+		print("Creating          : Creating App Icons and Launch Images")
+		with self.profiler.stage("icons") as stage:
+			if self.defaultFiles is None or self.defaultFiles.orientation != self.orientation:
+				self.defaultFiles = DefaultFiles("media"+os.sep+"system",self.orientation,self.workers,self.cacheDirectory)
+			elif changedFiles is not None:
+				self.defaultFiles.refresh(changedFiles)
+			pool = stage.pool(self.pool)
+			optimiser = PngOptimiser(self.workers,self.cacheDirectory,pool) if self.optimisePng else None
+			self.defaultFiles.optimiser = optimiser
+			self.defaultFiles.pool = pool
+			self.defaultFiles.timings = []
+			launchBackground = [int(x) for x in self.info.get("configuration","launchBackground").split(",")]
+			self.defaultFiles.create(False,"source",tuple(launchBackground),self.manifest)
+			self.defaultFiles.create(True,"source",(255,255,255,0),self.manifest)
+			stage.addFiles(self.defaultFiles.timings)
+		if optimiser is not None and len(optimiser.results) > 0:
+			for line in optimiser.report():
+				print("                  : "+line)
+
+	#
+	#	Pack media/graphics into texture atlases in build area\media\atlases
+	#
+	def graphics(self):
+		print("Creating          : Graphics atlases")
+		with self.profiler.stage("graphics") as stage:
+			graphics = GraphicsImporter("media"+os.sep+"graphics",self.workers,4096,2,ResourceBuilder.DENSITIES,self.cacheDirectory,stage.pool(self.pool))
+			graphics.importAll("source"+os.sep+"media",self.manifest)
+			self.graphicsDensities = graphics.made
+			stage.addFiles(graphics.timings)
+		print("                  : "+graphics.report())
+
+	#
+	#	Copying text/info files to build area\media converting to lua structure.
+	#
+	def text(self,changedFiles = None):
+		print("Copying           : Text/Configuration files")
+		with self.profiler.stage("text") as stage:
+			text = TextCopier("media"+os.sep+"text",self.workers,4*1024*1024,self.sharedCache,self.compactText,stage.pool(self.pool))
+			self.transfer(text,["xml"],changedFiles)
+			stage.addFiles(text.timings)
+		print("                  : "+text.report())
+
+	#
+	#	Copying sound effects etc. to build area\media, converting them with ffmpeg if it is available.
+	#
+	def sounds(self,changedFiles = None):
+		print("Copying           : Sound files.")
+		with self.profiler.stage("sounds") as stage:
+			sounds = AudioCopier("media"+os.sep+"sounds",self.workers,self.sharedCache or ContentCache(self.cacheDirectory),pool = stage.pool(self.pool))
+			self.transfer(sounds,["wav","mp3"],changedFiles)
+			stage.addFiles(sounds.timings)
+		print("                  : "+sounds.report())
+
+	#
+	#	Index everything in build area\media, so the app knows about its assets without loading them.
+	#
+	def index(self):
+		print("Creating          : assetindex.lua")
+		with self.profiler.stage("index") as stage:
+			index = AssetIndex("source"+os.sep+"media",self.manifest).create()
+			stage.addOutputs([index.fileName])
+		print("                  : "+index.report())
+
+	#
+	#	Copy everything, or just the files in changedFiles. Targets of changed files which have gone are removed.
+	#
+	def transfer(self,copier,types,changedFiles):
+		jobs = copier.scan(types,"source"+os.sep+"media")
+		if changedFiles is not None:
+			changed = set([os.path.normpath(f) for f in changedFiles])
+			jobs = [j for j in jobs if os.path.normpath(j[0]) in changed]
+			for f in changed:
+				if not os.path.exists(f) and f.split(".")[-1].lower() in types:
+					outFile = copier.targetFile("source"+os.sep+"media"+os.sep+os.path.basename(f).lower())
+					if os.path.isfile(outFile):
+						print("Removing          : "+outFile)
+						os.remove(outFile)
+		copier.transfer(jobs,self.manifest)
+
+	#
+	#	Rebuild whatever is affected by a list of changed files. A directory in the list (the watcher gives the
+	#	directories it watches if it lost track of the changes) means anything in it may have changed.
+	#
+	def update(self,changedFiles):
+		changedFiles = [os.path.normpath(f) for f in changedFiles]
+		changed = {}																	# stage directory => files, None all.
+		for d in ["system","graphics","text","sounds"]:
+			if "media" in changedFiles or "media"+os.sep+d in changedFiles:
+				changed[d] = None
+			else:
+				files = [f for f in changedFiles if f.startswith("media"+os.sep+d+os.sep)]
+				if len(files) > 0:
+					changed[d] = files
+		if "information.xml" in changedFiles:
+			settings = (self.orientation,self.info.get("configuration","launchBackground"))
+			self.information()
+			self.config()
+			if settings != (self.orientation,self.info.get("configuration","launchBackground")):
+				self.icons()
+		if "system" in changed:
+			if changed["system"] is None: 												# look at all the sources again.
+				self.defaultFiles = None
+			self.icons(changed["system"])
+		if "graphics" in changed:
+			densities = self.graphicsDensities
+			self.graphics()
+			if densities != self.graphicsDensities: 										# imageSuffix has changed
+				self.config()
+		if "text" in changed:
+			self.text(changed["text"])
+		if "sounds" in changed:
+			self.sounds(changed["sounds"])
+		if "graphics" in changed or "text" in changed or "sounds" in changed:
+			self.index()
+		self.manifest.save()
+
 #
-#	Create Application Icons and Launch Images.
+#	Keep a cache from growing for ever, once nothing is using it.
 #
-print("Creating          : Creating App Icons and Launch Images")
-dic = DefaultFiles("media"+os.sep+"system",orientation)
-launchBackground = [int(x) for x in info.get("configuration","launchBackground").split(",")]
-dic.create(False,"source",tuple(launchBackground))
-dic.create(True,"source",(255,255,255,0))
+def pruneCache(cacheDirectory):
+	files,size = ContentCache(cacheDirectory).prune()
+	if files > 0:
+		print("Pruned cache      : {0} files ({1} bytes)".format(files,size))
+
+def buildResources(workers,profiler = None,cacheDirectory = None,optimisePng = False,targets = None,compactText = False):
+	return ResourceBuilder(workers,profiler,cacheDirectory,optimisePng,compactText).build(targets)
+
 #
-#	Copying text/info files to build area\media converting to lua structure.
+#	Build, then keep watching information.xml and media, rebuilding what changes until stopped with Ctrl+C.
 #
-print("Copying           : Text/Configuration files")
-TextCopier("media"+os.sep+"text").copy(["xml"],"source"+os.sep+"media")
+def watchResources(workers,polling = False,debounce = 0.3,optimisePng = False,compactText = False):
+	builder = ResourceBuilder(workers,None,None,optimisePng,compactText)
+	builder.build()
+	watcher = createWatcher(["information.xml","media"],polling)
+	print("Watching          : information.xml and media ("+watcher.__class__.__name__+"), Ctrl+C to stop.")
+	try:
+		while True:
+			changed = watcher.wait(debounce)
+			if len(changed) == 0: 														# nothing we build from.
+				continue
+			print("Changed           : "+", ".join(changed))
+			try:
+				builder.update(changed)
+			except Exception:															# report it, and carry on watching.
+				traceback.print_exc()
+	except KeyboardInterrupt:
+		pass
+	watcher.close()
+	return builder.profiler
+
 #
-#	Copying sound effects etc. to build area\media
+#	The build is only run when this is the main program, as worker processes re-import it on some platforms.
 #
-print("Copying           : Sound files.")
-FileCopier("media"+os.sep+"sounds").copy(["wav","mp3"],"source"+os.sep+"media")
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Build resources into the source directory.")
+	parser.add_argument("-j","--jobs",type = int,default = os.cpu_count(),help = "number of worker processes")
+	parser.add_argument("--report",default = "temp"+os.sep+"buildreport.json",help = "where to write the JSON timing report")
+	parser.add_argument("--profile",help = "write cProfile statistics of the build to this file")
+	parser.add_argument("--timings",action = "store_true",help = "print the time taken by each stage")
+	parser.add_argument("--watch",action = "store_true",help = "keep rebuilding whatever changes in media or information.xml")
+	parser.add_argument("--poll",action = "store_true",help = "watch by polling rather than inotify")
+	parser.add_argument("--optimise-png",action = "store_true",help = "make icons and launch images as small as possible")
+	parser.add_argument("--compact-text",action = "store_true",help = "write text files as compact Lua, compiled if luac is installed")
+	parser.add_argument("--target",action = "append",help = "build just this (stage or output) and what it needs")
+	args = parser.parse_args()
+	if args.target is not None:
+		try:
+			ResourceBuilder(1).scheduler().required(args.target)
+		except ValueError as e: 														# not a stage or output.
+			parser.error(str(e))
+	if args.watch:
+		profiler = watchResources(args.jobs,args.poll,0.3,args.optimise_png,args.compact_text)
+	elif args.profile is not None:														# python profile of the main process
+		profile = cProfile.Profile()
+		profiler = profile.runcall(buildResources,args.jobs,None,None,args.optimise_png,args.target,args.compact_text)
+		profile.dump_stats(args.profile)
+	else:
+		profiler = buildResources(args.jobs,None,None,args.optimise_png,args.target,args.compact_text)
+	profiler.save(args.report)
+	if args.timings:
+		print(profiler.summary())
 
 #  ****************************************************************************************************************
 # 		Date		Changes Made
 #		----		------------
 #		29 Dec 14 	First working version.
+#		18 Oct 26 	Incremental build using a build manifest in temp.
+#		18 Oct 26 	Build is now a function, run from __main__, with -j to set the number of worker processes.
+#		18 Oct 26 	Scaled icon/launch artwork is cached in temp/cache.
+#		18 Oct 26 	Sounds copied in parallel, with a report of what was copied.
+#		18 Oct 26 	Text files of 4Mb or more are converted by streaming.
+#		18 Oct 26 	Text files converted in parallel.
+#		18 Oct 26 	Each stage is timed, report written to temp/buildreport.json, optional cProfile output.
+#		18 Oct 26 	Optional shared cache directory, for fleetbuild.py
+#		18 Oct 26 	Build split into ResourceBuilder stages ; --watch rebuilds just what changes.
+#		18 Oct 26 	--optimise-png makes the icons and launch images smaller.
+#		18 Oct 26 	Sounds are converted by AudioCopier (ffmpeg), cached in temp/cache.
+#		18 Oct 26 	Graphics in media/graphics packed into atlases.
+#		18 Oct 26 	Graphics made at @1x, @2x and @4x, with imageSuffix in config.lua
+#		18 Oct 26 	Stages run by a dependency scheduler, independent ones at once ; --target builds just one.
+#		18 Oct 26 	--compact-text writes text files as compact (and if possible compiled) Lua.
+#		18 Oct 26 	source/media/assetindex.lua lists every asset built.
+#		18 Oct 26 	Stages share one worker pool.
+#		18 Oct 26 	imageSuffix only for the densities the graphics were made at, so config is made after them.
+#		18 Oct 26 	--watch ignores a wait with no changes.
+#		18 Oct 26 	temp/cache is pruned after a build.
+#		18 Oct 26 	Graphics atlases are in source/media/atlases.
+#		18 Oct 26 	--watch rebuilds everything in a directory it is given, e.g. after the watcher overflows.
+#		18 Oct 26 	Each stage's worker jobs are timed ; an unknown --target is a usage error.
 # 
 #  ****************************************************************************************************************
 
-# TODO: Graphic Import
 # TODO: Font Import